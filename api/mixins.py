@@ -1,7 +1,19 @@
+import hashlib
+from calendar import timegm
+
+from django.conf import settings
+from django.db.models import Max
+from django.http import StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from rest_framework.exceptions import NotFound, ValidationError
 from rest_framework.mixins import (CreateModelMixin,
                                    ListModelMixin,
                                    RetrieveModelMixin,
                                    UpdateModelMixin)
+from rest_framework.response import Response
+
+from api.renderers import NDJSONRenderer
 
 
 class CreateListRetrieveMixin(CreateModelMixin,
@@ -9,3 +21,184 @@ class CreateListRetrieveMixin(CreateModelMixin,
                               UpdateModelMixin,
                               ListModelMixin):
     pass
+
+
+class StreamingListMixin:
+    # Adds an opt-in NDJSON renderer (Accept: application/x-ndjson or
+    # ?format=ndjson). With it, list streams the whole filtered queryset,
+    # unpaginated, in primary key order: chunks of stream_chunk_size rows
+    # are loaded and serialized one at a time, so the first line goes out
+    # after one chunk and memory stays flat however long the list is.
+    stream_chunk_size = settings.API_STREAM_CHUNK_SIZE
+
+    def get_renderers(self):
+        return super().get_renderers() + [NDJSONRenderer()]
+
+    def iter_chunks(self, queryset):
+        last_pk = 0
+        while True:
+            pks = list(queryset.filter(pk__gt=last_pk).order_by('pk')
+                       .values_list('pk', flat=True)[:self.stream_chunk_size])
+            if not pks:
+                return
+            yield queryset.filter(pk__in=pks).order_by('pk')
+            last_pk = pks[-1]
+
+    def serialize_chunk(self, queryset):
+        read_serializer_class = getattr(self, 'read_serializer_class', None)
+        if read_serializer_class is not None:
+            return read_serializer_class(queryset).data
+        return self.get_serializer(queryset, many=True).data
+
+    def stream(self, renderer, queryset):
+        for chunk in self.iter_chunks(queryset):
+            yield b''.join(renderer.render_line(row)
+                           for row in self.serialize_chunk(chunk))
+
+    def list(self, request, *args, **kwargs):
+        renderer = request.accepted_renderer
+        if not isinstance(renderer, NDJSONRenderer):
+            return super().list(request, *args, **kwargs)
+        queryset = self.filter_queryset(self.get_queryset())
+        return StreamingHttpResponse(self.stream(renderer, queryset),
+                                     content_type=renderer.media_type)
+
+
+class ValuesReadMixin:
+    # list and retrieve render through read_serializer_class, which builds
+    # the representation from values() rows; writes keep the model
+    # serializer.
+    read_serializer_class = None
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        return Response(self.read_serializer_class(queryset).data)
+
+    def retrieve(self, request, *args, **kwargs):
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        queryset = self.filter_queryset(self.get_queryset()).filter(
+            **{self.lookup_field: kwargs[lookup_url_kwarg]}
+        )
+        data = self.read_serializer_class(queryset).data
+        if not data:
+            raise NotFound
+        return Response(data[0])
+
+
+class SparseFieldsetMixin:
+    # ?fields=id,title,price limits both the serializer and the columns
+    # loaded; many-to-many fields are prefetched only when requested.
+    fields_query_param = 'fields'
+    always_load = ()
+
+    def get_requested_fields(self):
+        if hasattr(self, '_requested_fields'):
+            return self._requested_fields
+        value = self.request.query_params.get(self.fields_query_param)
+        requested = None
+        if value:
+            requested = {name.strip() for name in value.split(',')
+                         if name.strip()}
+            available = set(self.get_serializer_class()().fields)
+            unknown = requested - available
+            if unknown:
+                raise ValidationError({self.fields_query_param: [
+                    f'Unknown fields: {", ".join(sorted(unknown))}'
+                ]})
+        self._requested_fields = requested
+        return requested
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.request is None or self.request.method != 'GET':
+            return queryset
+        opts = queryset.model._meta
+        requested = self.get_requested_fields()
+        names = (requested if requested is not None
+                 else self.get_serializer_class()().fields)
+        model_fields = {field.name: field for field in opts.get_fields()}
+        columns, related = set(self.always_load), []
+        for name in names:
+            field = model_fields.get(name)
+            if field is None:
+                continue
+            if field.many_to_many:
+                related.append(name)
+            elif field.concrete:
+                columns.add(name)
+        if related:
+            queryset = queryset.prefetch_related(*related)
+        if requested is not None:
+            queryset = queryset.only(*columns)
+        return queryset
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        if self.request is not None and self.request.method == 'GET':
+            context['fields'] = self.get_requested_fields()
+        return context
+
+
+class ConditionalGetMixin:
+    # ETag and Last-Modified for list and retrieve. A list is stamped with
+    # the newest modification time of the whole queryset, not just the
+    # filtered rows (a row that changes out of a filter leaves nothing
+    # behind in it), plus the newest tombstone for deletions. Both are
+    # single index lookups taken before any page is loaded.
+    last_modified_field = 'updated_at'
+    # Model whose rows record deletions, newest by its deleted_field.
+    tombstone_model = None
+    deleted_field = 'deleted_at'
+
+    def get_etag(self, request, *parts):
+        raw = '|'.join(str(part) for part in (
+            request.get_full_path(), request.accepted_renderer.format, *parts
+        ))
+        return quote_etag(hashlib.md5(raw.encode()).hexdigest())
+
+    def conditional_response(self, request, etag, last_modified, render):
+        timestamp = (timegm(last_modified.utctimetuple())
+                     if last_modified else None)
+        response = get_conditional_response(
+            request, etag=etag, last_modified=timestamp
+        )
+        if response is None:
+            response = render()
+        response['ETag'] = etag
+        if timestamp is not None:
+            response['Last-Modified'] = http_date(timestamp)
+        return response
+
+    def get_last_deletion(self, queryset):
+        # From the database the rows come from, replica or not.
+        if self.tombstone_model is None:
+            return None
+        return self.tombstone_model.objects.using(queryset.db).order_by(
+            f'-{self.deleted_field}', '-pk'
+        ).values_list(self.deleted_field, 'pk').first()
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.get_queryset()
+        last_modified = queryset.aggregate(
+            last_modified=Max(self.last_modified_field)
+        )['last_modified']
+        last_deletion = self.get_last_deletion(queryset)
+        etag = self.get_etag(request, last_modified, last_deletion)
+        if last_deletion is not None and (last_modified is None
+                                          or last_deletion[0] > last_modified):
+            last_modified = last_deletion[0]
+        return self.conditional_response(
+            request, etag, last_modified,
+            lambda: super(ConditionalGetMixin, self).list(
+                request, *args, **kwargs
+            )
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        instance = self.get_object()
+        last_modified = getattr(instance, self.last_modified_field)
+        etag = self.get_etag(request, instance.pk, last_modified)
+        return self.conditional_response(
+            request, etag, last_modified,
+            lambda: Response(self.get_serializer(instance).data)
+        )
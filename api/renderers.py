@@ -0,0 +1,20 @@
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+
+
+class NDJSONRenderer(BaseRenderer):
+    # Newline-delimited JSON, one object per line. List views that stream
+    # write their lines through render_line(); anything else (a detail,
+    # an error) is rendered here, a list one element per line.
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+    charset = None
+    json_renderer = JSONRenderer()
+
+    def render_line(self, obj):
+        return self.json_renderer.render(obj) + b'\n'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        rows = data if isinstance(data, list) else [data]
+        return b''.join(self.render_line(row) for row in rows)
@@ -1,17 +1,48 @@
+from collections import defaultdict
+
 from rest_framework import serializers
-from store.models import Item, Order, OrderItem
+from store import pricing
+from store.models import Item, ItemTombstone, Order, OrderItem
+
+
+class SparseFieldsetSerializerMixin:
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        requested = self.context.get('fields')
+        if requested is not None:
+            for name in set(self.fields) - set(requested):
+                self.fields.pop(name)
 
 
-class ItemSerializer(serializers.ModelSerializer):
+class ItemSerializer(SparseFieldsetSerializerMixin,
+                     serializers.ModelSerializer):
     class Meta:
         model = Item
         fields = '__all__'
 
 
+class ItemTombstoneSerializer(serializers.ModelSerializer):
+    id = serializers.IntegerField(source='item_id')
+
+    class Meta:
+        model = ItemTombstone
+        fields = ('id', 'slug', 'deleted_at')
+
+
+class OrderItemListSerializer(serializers.ListSerializer):
+    def to_representation(self, data):
+        lines = data.all() if hasattr(data, 'all') else data
+        return super().to_representation(pricing.attach(lines))
+
+
 class OrderItemSerializer(serializers.ModelSerializer):
+    final_price = serializers.FloatField(source='prices.final',
+                                         read_only=True)
+
     class Meta:
         model = OrderItem
         fields = '__all__'
+        list_serializer_class = OrderItemListSerializer
 
 
 class OrderSerializer(serializers.ModelSerializer):
@@ -19,4 +50,71 @@ class OrderSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Order
-        fields = '__all__'
+        # Listed, not '__all__': the checkout idempotency key is private.
+        fields = ('id', 'items', 'ref_code', 'start_date', 'ordered_date',
+                  'ordered', 'total', 'item_count', 'coupon_amount', 'user',
+                  'shipping_address', 'coupon', 'status')
+
+
+def _formatters(serializer_class):
+    # Field order of a serializer plus the formatting its date fields need;
+    # every other field here is rendered as the database returns it.
+    formatters = {}
+    for name, field in serializer_class().fields.items():
+        formatters[name] = None
+        if isinstance(field, serializers.DateTimeField):
+            # Resolve the current timezone once, not once per value.
+            field.timezone = field.default_timezone()
+            formatters[name] = field.to_representation
+    return formatters
+
+
+def _render(row, formatters):
+    return {
+        name: (row[name] if format is None or row[name] is None
+               else format(row[name]))
+        for name, format in formatters.items()
+    }
+
+
+class OrderValuesSerializer:
+    # Read-only twin of OrderSerializer: renders the orders of a queryset
+    # from two values() queries (orders, then every line with its item
+    # prices) to the same representation, without model instances.
+    line_prefix = 'orderitem__'
+
+    def __init__(self, queryset):
+        self.queryset = queryset.prefetch_related(None)
+        self.order_fields = _formatters(OrderSerializer)
+        self.line_fields = _formatters(OrderItemSerializer)
+
+    def get_lines(self):
+        columns = [name for name in self.line_fields if name != 'final_price']
+        rows = Order.items.through.objects.filter(
+            order__in=self.queryset.order_by().values('pk')
+        ).order_by(f'{self.line_prefix}item').values_list(
+            'order_id', f'{self.line_prefix}item__price',
+            f'{self.line_prefix}item__discount_price',
+            *[self.line_prefix + name for name in columns]
+        )
+        lines = defaultdict(list)
+        for order_id, item_price, item_discount_price, *values in rows:
+            line = dict(zip(columns, values))
+            # Placed lines are priced from their checkout snapshot.
+            unit_prices = ((line['price'], line['discount_price'])
+                           if line['price'] is not None
+                           else (item_price, item_discount_price))
+            line['final_price'] = pricing.price_line(line['quantity'],
+                                                     *unit_prices).final
+            lines[order_id].append(_render(line, self.line_fields))
+        return lines
+
+    @property
+    def data(self):
+        columns = [name for name in self.order_fields if name != 'items']
+        lines = self.get_lines()
+        data = []
+        for row in self.queryset.values(*columns):
+            row['items'] = lines.get(row['id'], [])
+            data.append(_render(row, self.order_fields))
+        return data
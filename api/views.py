@@ -1,19 +1,110 @@
+from django.conf import settings
+from rest_framework import status
+from rest_framework.decorators import action
+from rest_framework.exceptions import APIException, NotFound, ValidationError
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
 from rest_framework.viewsets import GenericViewSet, ModelViewSet
 
-from api.serializers import ItemSerializer, OrderSerializer
-from api.mixins import CreateListRetrieveMixin
+from api.serializers import (ItemSerializer,
+                             ItemTombstoneSerializer,
+                             OrderSerializer,
+                             OrderValuesSerializer)
+from api.mixins import (ConditionalGetMixin,
+                        CreateListRetrieveMixin,
+                        SparseFieldsetMixin,
+                        StreamingListMixin,
+                        ValuesReadMixin)
+from api.pagination import KeysetCursorPagination
 from api.permissions import IsAdminOrReadOnly
 
-from store.models import Item, Order
+from store import routers, sync
+from store.bulk import IdCache, upsert_items
+from store.models import Item, ItemTombstone, Order
+from store.pagination import CURSOR_PARAM, InvalidCursor
 
 
-class ItemViewSet(GenericViewSet, CreateListRetrieveMixin):
+class CursorExpired(APIException):
+    status_code = status.HTTP_410_GONE
+    default_detail = ('Cursor is older than the kept deletions, '
+                      'sync again from the start.')
+    default_code = 'cursor_expired'
+
+
+class ItemViewSet(StreamingListMixin, ConditionalGetMixin, SparseFieldsetMixin,
+                  GenericViewSet, CreateListRetrieveMixin):
     queryset = Item.objects.all()
+    # The keyset cursor and the ETag read these even when not requested.
+    always_load = ('created_at', 'updated_at')
+    tombstone_model = ItemTombstone
     serializer_class = ItemSerializer
     permission_classes = (IsAdminOrReadOnly,)
+    pagination_class = KeysetCursorPagination
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        # changes stays on the primary: a lagging replica could hide rows
+        # older than the cursor, and the consumer would skip them.
+        if self.action in ('list', 'retrieve'):
+            routers.use_replica()
 
+    @action(detail=False, methods=['post'],
+            permission_classes=(IsAdminUser,))
+    def bulk(self, request):
+        # A list of items in the API representation, upserted by slug in
+        # one transaction. Invalid rows are reported and skipped; the
+        # rest are written.
+        rows = request.data
+        if not isinstance(rows, list) or not all(isinstance(row, dict)
+                                                 for row in rows):
+            raise ValidationError({'non_field_errors': [
+                'Expected a list of items.'
+            ]})
+        if len(rows) > settings.API_BULK_MAX_ITEMS:
+            raise ValidationError({'non_field_errors': [
+                f'At most {settings.API_BULK_MAX_ITEMS} items per request.'
+            ]})
+        results = upsert_items(rows, IdCache())
+        return Response({
+            'created': sum(result.status == 'created' for result in results),
+            'updated': sum(result.status == 'updated' for result in results),
+            'failed': sum(not result.ok for result in results),
+            'results': [result.as_dict() for result in results],
+        })
 
-class OrderViewSet(ModelViewSet):
-    queryset = Order.objects.all()
+    @action(detail=False)
+    def changes(self, request):
+        # Delta sync: items changed and deleted after ?cursor=, oldest
+        # first. Without a cursor it starts from the beginning; keep
+        # following next until more is false, then poll with the last one.
+        try:
+            changed, deleted, cursor, more = sync.changes(
+                self.get_queryset(), request.query_params.get(CURSOR_PARAM)
+            )
+        except sync.CursorExpired:
+            raise CursorExpired
+        except InvalidCursor:
+            raise NotFound('Invalid cursor')
+        return Response({
+            'next': cursor,
+            'more': more,
+            'changed': self.get_serializer(changed, many=True).data,
+            'deleted': ItemTombstoneSerializer(deleted, many=True).data,
+        })
+
+
+class OrderViewSet(StreamingListMixin, ValuesReadMixin, ModelViewSet):
+    queryset = Order.objects.prefetch_related('items__item')
     serializer_class = OrderSerializer
+    read_serializer_class = OrderValuesSerializer
     permission_classes = (IsAdminOrReadOnly,)
+
+    def get_queryset(self):
+        # Staff see every order, everyone else only their own.
+        queryset = super().get_queryset()
+        user = self.request.user
+        if user.is_staff:
+            return queryset
+        if not user.is_authenticated:
+            return queryset.none()
+        return queryset.filter(user=user)
@@ -1,18 +1,63 @@
 from django.contrib import admin
-from django.core.exceptions import ValidationError
+from django.contrib.admin.views.main import ChangeList
+from django.core.exceptions import PermissionDenied, ValidationError
+from django.http import Http404, StreamingHttpResponse
+from django.urls import path
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
+from store import exports, pricing
 from store.models import (Address,
                           Category,
                           Coupon,
                           Item,
+                          Job,
                           Order,
                           OrderItem,
                           OrderStatus,
                           Refund,
+                          Stock,
                           Tag)
 
 
+class ExportMixin:
+    # Streams the whole table through store.exports; chunked reads keep
+    # memory flat however many rows there are.
+    export_name = None
+    change_list_template = 'admin/store/export_change_list.html'
+
+    def get_export_url_name(self):
+        opts = self.model._meta
+        return f'{opts.app_label}_{opts.model_name}_export'
+
+    def get_urls(self):
+        return [
+            path('export/<str:fmt>/',
+                 self.admin_site.admin_view(self.export_view),
+                 name=self.get_export_url_name()),
+        ] + super().get_urls()
+
+    def changelist_view(self, request, extra_context=None):
+        extra_context = {
+            'export_url': f'admin:{self.get_export_url_name()}',
+            **(extra_context or {}),
+        }
+        return super().changelist_view(request, extra_context)
+
+    def export_view(self, request, fmt):
+        if not self.has_view_permission(request):
+            raise PermissionDenied
+        if fmt not in exports.FORMATS:
+            raise Http404
+        response = StreamingHttpResponse(
+            exports.export(self.export_name, fmt),
+            content_type=exports.content_type(fmt)
+        )
+        filename = f'{self.export_name}-{timezone.now():%Y%m%d-%H%M}.{fmt}'
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+
+
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
     list_display = ('name',)
@@ -24,9 +69,12 @@ class TagAdmin(admin.ModelAdmin):
 
 
 @admin.register(Order)
-class OrderAdmin(admin.ModelAdmin):
+class OrderAdmin(ExportMixin, admin.ModelAdmin):
+    export_name = 'orders'
     list_display = ('user',
                     'ordered',
+                    'total',
+                    'item_count',
                     'get_shipping_address',
                     'coupon')
     list_display_links = ('user',)
@@ -59,8 +107,16 @@ class AddressAdmin(admin.ModelAdmin):
                      'zip')
 
 
+class StockInline(admin.TabularInline):
+    model = Stock
+    fields = ('on_hand', 'reserved')
+    readonly_fields = ('reserved',)
+
+
 @admin.register(Item)
-class ItemAdmin(admin.ModelAdmin):
+class ItemAdmin(ExportMixin, admin.ModelAdmin):
+    export_name = 'items'
+    inlines = (StockInline,)
     list_display = ('title',
                     'price',
                     'discount_price',
@@ -76,6 +132,20 @@ class ItemAdmin(admin.ModelAdmin):
 
     get_tags.short_description = 'Tags'
 
+    def save_formset(self, request, form, formset, change):
+        if formset.model is not Stock:
+            return super().save_formset(request, form, formset, change)
+        # reserved moves under concurrent carts; only on_hand is the
+        # admin's to overwrite.
+        changed = formset.save(commit=False)
+        for obj in formset.deleted_objects:
+            obj.delete()
+        for obj in changed:
+            if obj._state.adding:
+                obj.save()
+            else:
+                obj.save(update_fields=['on_hand'])
+
     def create_new_item(modeladmin, request, queryset):
 
         try:
@@ -89,6 +159,14 @@ class ItemAdmin(admin.ModelAdmin):
     create_new_item.short_description = 'Create a copy of selected object'
 
 
+class PricedChangeList(ChangeList):
+    # Prices the whole page in one pass instead of four item lookups per
+    # row from the OrderItem.get_* methods.
+    def get_results(self, request):
+        super().get_results(request)
+        self.result_list = pricing.attach(self.result_list)
+
+
 @admin.register(OrderItem)
 class OrderItemAdmin(admin.ModelAdmin):
     list_display = (
@@ -101,16 +179,82 @@ class OrderItemAdmin(admin.ModelAdmin):
         'get_amount_saved',
         'get_final_price'
     )
+    list_select_related = ('user', 'item')
 
     list_filter = ('ordered',)
     actions = ['mark_as_ordered']
 
+    def get_changelist(self, request, **kwargs):
+        return PricedChangeList
+
+    def get_total_item_price(self, obj):
+        return obj.prices.total
+
+    get_total_item_price.short_description = _('Total price')
+
+    def get_total_discount_item_price(self, obj):
+        return obj.prices.discount_total
+
+    get_total_discount_item_price.short_description = _(
+        'Total discount price'
+    )
+
+    def get_amount_saved(self, obj):
+        return obj.prices.saved
+
+    get_amount_saved.short_description = _('Amount saved')
+
+    def get_final_price(self, obj):
+        return obj.prices.final
+
+    get_final_price.short_description = _('Final price')
+
     def mark_as_ordered(modeladmin, request, queryset):
         queryset.update(ordered=True)
 
     mark_as_ordered.short_description = 'Mark as ordered'
 
 
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('name',
+                    'status',
+                    'attempts',
+                    'run_at',
+                    'finished_at')
+    list_filter = ('status', 'name')
+    readonly_fields = ('locked_by', 'locked_at', 'created_at', 'finished_at')
+    actions = ['retry_jobs']
+
+    def retry_jobs(modeladmin, request, queryset):
+        queryset.exclude(status=Job.RUNNING).update(
+            status=Job.PENDING, attempts=0, run_at=timezone.now()
+        )
+
+    retry_jobs.short_description = _('Retry selected jobs')
+
+
+@admin.register(Coupon)
+class CouponAdmin(admin.ModelAdmin):
+    list_display = ('code',
+                    'amount',
+                    'valid_from',
+                    'valid_until',
+                    'uses',
+                    'max_uses')
+    search_fields = ('code',)
+    readonly_fields = ('uses',)
+
+    def save_model(self, request, obj, form, change):
+        if not change:
+            return super().save_model(request, obj, form, change)
+        # uses is counted by checkouts; never write back the copy loaded
+        # with the form.
+        obj.save(update_fields=[
+            field.name for field in obj._meta.concrete_fields
+            if not field.primary_key and field.name != 'uses'
+        ])
+
+
 admin.site.register(OrderStatus)
-admin.site.register(Coupon)
 admin.site.register(Refund)
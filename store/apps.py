@@ -1,7 +1,13 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 from django.utils.translation import gettext_lazy as _
 
 
 class StoreConfig(AppConfig):
     name = 'store'
     verbose_name = _('Store')
+
+    def ready(self):
+        from store import signals, tasks  # noqa: F401
+
+        post_migrate.connect(signals.search_triggers_receiver, sender=self)
@@ -0,0 +1,223 @@
+import random
+import statistics
+import time
+from dataclasses import dataclass, field
+from uuid import uuid4
+
+from django.conf import settings
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.utils import timezone
+
+from store import cart, coupons, facets
+from store.cache import bump_item_versions, invalidate_categories
+from store.models import (Address,
+                          Category,
+                          Coupon,
+                          Item,
+                          Order,
+                          OrderItem,
+                          Tag,
+                          User)
+
+SAMPLE_IMAGE = 'images/items/shoes.gif'
+WORDS = ('кроссовки', 'кеды', 'ботинки', 'куртка', 'футболка', 'худи',
+         'кепка', 'рюкзак', 'часы', 'очки', 'красный', 'синий', 'черный')
+
+
+def seed_catalog(items=500, categories=6, tags=10, prefix=None):
+    prefix = prefix or f'bench-{uuid4().hex[:8]}'
+    rnd = random.Random(prefix)
+
+    Category.objects.bulk_create(
+        Category(name=f'{prefix} category {i}', slug=f'{prefix}-c{i}')
+        for i in range(categories)
+    )
+    Tag.objects.bulk_create(
+        Tag(title=f'{prefix} tag {i}', color='#a52a2a',
+            slug=f'{prefix}-t{i}')
+        for i in range(tags)
+    )
+    category_list = list(Category.objects.filter(slug__startswith=prefix))
+    tag_list = list(Tag.objects.filter(slug__startswith=prefix))
+
+    rows = []
+    for i in range(items):
+        price = rnd.randint(5, 500) * 10.0
+        rows.append(Item(
+            title=' '.join(rnd.sample(WORDS, 2)).capitalize(),
+            price=price,
+            discount_price=price * 0.8 if i % 3 == 0 else None,
+            category=rnd.choice(category_list),
+            slug=f'{prefix}-i{i}',
+            description=' '.join(rnd.choices(WORDS, k=40)),
+            image=SAMPLE_IMAGE,
+        ))
+    Item.objects.bulk_create(rows, batch_size=500)
+    item_list = list(Item.objects.filter(slug__startswith=prefix))
+
+    Through = Item.label.through
+    Through.objects.bulk_create(
+        [Through(item_id=item.id, tag_id=tag.id)
+         for item in item_list
+         for tag in rnd.sample(tag_list, min(2, len(tag_list)))],
+        batch_size=500,
+    )
+    facets.rebuild()
+    return {
+        'prefix': prefix,
+        'categories': category_list,
+        'tags': tag_list,
+        'items': item_list,
+    }
+
+
+def seed_customer(items, prefix, cart_size=5):
+    user = User.objects.create_user(
+        username=f'{prefix}-user', password=uuid4().hex
+    )
+    Address.objects.create(user=user, street_address='Bench st. 1',
+                           country='RU', zip='101000', default=True)
+    coupon = Coupon.objects.create(code=prefix[-15:], amount=10)
+    order = seed_cart(user, items[:cart_size])
+    return {'user': user, 'order': order, 'coupon': coupon,
+            'cart_items': items[:cart_size]}
+
+
+def seed_cart(user, items):
+    order = Order.objects.create(user=user, ordered_date=timezone.now())
+    for item in items:
+        order.items.add(OrderItem.objects.create(
+            user=user, item=item, ordered=False, quantity=2
+        ))
+    return order
+
+
+def seed_orders(items, count, lines, prefix):
+    user = User.objects.create_user(username=f'{prefix}-user',
+                                    password=uuid4().hex)
+    now = timezone.now()
+    Order.objects.bulk_create(
+        [Order(user=user, ordered=True, ordered_date=now,
+               ref_code=f'{prefix}-{i}') for i in range(count)],
+        batch_size=1000
+    )
+    orders = list(Order.objects.filter(user=user).values_list('pk',
+                                                              flat=True))
+    OrderItem.objects.bulk_create(
+        [OrderItem(user=user, item=items[(i + j) % len(items)], quantity=2,
+                   price=items[(i + j) % len(items)].price,
+                   discount_price=items[(i + j) % len(items)].discount_price)
+         for i in range(count) for j in range(lines)],
+        batch_size=1000
+    )
+    line_ids = list(OrderItem.objects.filter(user=user).order_by('pk')
+                    .values_list('pk', flat=True))
+    Through = Order.items.through
+    Through.objects.bulk_create(
+        [Through(order_id=order_id, orderitem_id=line_ids[i * lines + j])
+         for i, order_id in enumerate(orders) for j in range(lines)],
+        batch_size=1000
+    )
+    Order.objects.filter(user=user).refresh_totals()
+    return user
+
+
+def reset_cart(customer):
+    # Puts the seeded cart back, so a request that changes or orders it
+    # takes the same path every time.
+    user = customer['user']
+    OrderItem.objects.filter(user=user, ordered=False).delete()
+    Order.objects.filter(user=user, ordered=False).delete()
+    seed_cart(user, customer['cart_items'])
+    # Cached again, as in a session that has been using its cart.
+    cart.clear(user)
+    cart.load(cart.user_cart_id(user), user)
+
+
+def forget_seed(catalog, customer=None):
+    # Call after rolling the seed back. bulk_create skipped the receivers
+    # that drop cached categories and item cards, and the ids of the rolled
+    # back rows will be handed out again.
+    invalidate_categories()
+    bump_item_versions([item.pk for item in catalog['items']])
+    coupons.invalidate()
+    if customer is not None:
+        cart.clear(customer['user'])
+
+
+@dataclass
+class RouteResult:
+    name: str
+    method: str
+    url: str
+    budget: int
+    expected_status: int = 200
+    status: int = 0
+    queries: int = 0
+    query_time: float = 0.0
+    wall_times: list = field(default_factory=list)
+
+    @property
+    def wall_time(self):
+        return statistics.median(self.wall_times) if self.wall_times else 0
+
+    @property
+    def over_budget(self):
+        return self.queries > self.budget
+
+    @property
+    def failed(self):
+        return self.over_budget or self.status != self.expected_status
+
+    def as_dict(self):
+        return {
+            'name': self.name,
+            'method': self.method,
+            'url': self.url,
+            'status': self.status,
+            'expected_status': self.expected_status,
+            'queries': self.queries,
+            'budget': self.budget,
+            'query_time_ms': round(self.query_time * 1000, 3),
+            'wall_time_ms': round(self.wall_time * 1000, 3),
+        }
+
+
+def measure_route(client, name, method, url, budget, data=None, repeat=3,
+                  warmup=1, expected_status=200, setup=None):
+    # The first warmup requests fill the caches and are not measured; of
+    # the repeat measured ones the route reports its worst query count,
+    # and the first status that is not the expected one. setup runs before
+    # every request, unmeasured.
+    result = RouteResult(name=name, method=method, url=url, budget=budget,
+                         expected_status=expected_status)
+    request = getattr(client, method.lower())
+    for _ in range(warmup):
+        if setup is not None:
+            setup()
+        request(url, data or {})
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        with CaptureQueriesContext(connection) as ctx:
+            started = time.perf_counter()
+            response = request(url, data or {})
+            result.wall_times.append(time.perf_counter() - started)
+        if result.status in (0, expected_status):
+            result.status = response.status_code
+        if len(ctx.captured_queries) >= result.queries:
+            result.queries = len(ctx.captured_queries)
+            result.query_time = sum(
+                float(query['time']) for query in ctx.captured_queries
+            )
+    return result
+
+
+def benchmark_client(user=None):
+    middleware = [m for m in settings.MIDDLEWARE if 'debug_toolbar' not in m]
+    client = Client()
+    if user is not None:
+        client.force_login(user)
+    return client, override_settings(MIDDLEWARE=middleware)
@@ -0,0 +1,235 @@
+import re
+from collections import Counter
+from dataclasses import dataclass, field
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.utils import timezone
+
+from store import facets, jobs
+from store.cache import bump_item_versions
+from store.models import Category, FacetCount, Item, Order, Tag
+
+Through = Item.label.through
+
+ITEM_FIELDS = ('title', 'price', 'discount_price', 'category', 'description',
+               'image')
+REQUIRED_FIELDS = ('title', 'price', 'description')
+
+
+@dataclass
+class RowResult:
+    index: int
+    slug: str = None
+    status: str = None
+    id: int = None
+    errors: dict = field(default_factory=dict)
+
+    @property
+    def ok(self):
+        return not self.errors
+
+    def as_dict(self):
+        data = {'index': self.index, 'slug': self.slug, 'status': self.status}
+        if self.id is not None:
+            data['id'] = self.id
+        if self.errors:
+            data['errors'] = self.errors
+        return data
+
+
+class SlugCache:
+    # Category and Tag tables are small: load them once per import instead
+    # of resolving every row's slugs with a query.
+    tags_field = 'tags'
+
+    def __init__(self):
+        self.categories = dict(Category.objects.values_list('slug', 'id'))
+        self.tags = dict(Tag.objects.values_list('slug', 'id'))
+
+    def category(self, slug):
+        if slug in (None, ''):
+            return None
+        if not isinstance(slug, (str, int)) or slug not in self.categories:
+            raise ValidationError(f'Unknown category "{slug}"')
+        return self.categories[slug]
+
+    def tag_ids(self, value):
+        if value is None:
+            return None
+        if isinstance(value, str):
+            value = [slug for slug in re.split(r'[|,]', value) if slug]
+        unknown = [slug for slug in value if slug not in self.tags]
+        if unknown:
+            raise ValidationError(
+                f'Unknown tags: {", ".join(map(str, unknown))}'
+            )
+        return {self.tags[slug] for slug in value}
+
+
+class IdCache(SlugCache):
+    # The API refers to categories and tags by primary key.
+    tags_field = 'label'
+
+    def __init__(self):
+        self.categories = {pk: pk for pk in
+                           Category.objects.values_list('id', flat=True)}
+        self.tags = {pk: pk for pk in Tag.objects.values_list('id', flat=True)}
+
+
+def _slug(row):
+    # Rows may come from JSON: anything but a string is no slug.
+    slug = row.get('slug')
+    return slug if isinstance(slug, str) else None
+
+
+def _number(value):
+    if value in (None, ''):
+        return None
+    if not isinstance(value, (str, int, float)) or isinstance(value, bool):
+        raise TypeError('A number is required.')
+    return float(value)
+
+
+def _set_field(item, name, value, slugs):
+    if name == 'category':
+        item.category_id = slugs.category(value)
+    elif name in ('price', 'discount_price'):
+        setattr(item, name, _number(value))
+    elif value is None or isinstance(value, str):
+        setattr(item, name, value or '')
+    else:
+        raise TypeError('Expected a string.')
+
+
+def _apply_row(item, row, slugs):
+    errors = {}
+    for name in ITEM_FIELDS:
+        if name not in row:
+            continue
+        try:
+            _set_field(item, name, row[name], slugs)
+        except (TypeError, ValueError, ValidationError) as error:
+            errors[name] = [str(getattr(error, 'message', error))]
+    if not errors:
+        try:
+            item.full_clean(exclude=('category', 'image'),
+                            validate_unique=False)
+        except ValidationError as error:
+            errors.update(error.message_dict)
+    return errors
+
+
+def _tag_ids(row, slugs, errors):
+    try:
+        return slugs.tag_ids(row.get(slugs.tags_field))
+    except TypeError:
+        errors[slugs.tags_field] = ['Expected a list of tags.']
+    except ValidationError as error:
+        errors[slugs.tags_field] = error.messages
+
+
+def _prepare(rows, results, existing, slugs):
+    seen = Counter(_slug(row) for row in rows)
+    to_create, to_update, labels = [], [], {}
+    for row, result in zip(rows, results):
+        result.slug = slug = _slug(row)
+        if row.get('slug') is not None and slug is None:
+            result.errors['slug'] = ['Expected a string.']
+            continue
+        if not slug:
+            result.errors['slug'] = ['This field is required.']
+            continue
+        if seen[slug] > 1:
+            result.errors['slug'] = ['Duplicate slug in the batch.']
+            continue
+
+        item = existing.get(slug)
+        if item is None:
+            result.errors.update({
+                name: ['This field is required.']
+                for name in REQUIRED_FIELDS if name not in row
+            })
+            item = Item(slug=slug)
+        if not result.errors:
+            result.errors.update(_apply_row(item, row, slugs))
+        tag_ids = _tag_ids(row, slugs, result.errors)
+        if result.errors:
+            continue
+
+        result.status = 'created' if item.pk is None else 'updated'
+        (to_create if item.pk is None else to_update).append(item)
+        if tag_ids is not None:
+            labels[slug] = tag_ids
+    return to_create, to_update, labels
+
+
+def _facet_delta(items, old_keys, old_tag_ids, labels):
+    delta = Counter()
+    for item in items:
+        for key in old_keys.get(item.pk, ()):
+            delta[key] -= 1
+        for key in facets.scalar_keys(item.category_id, item.price,
+                                      item.discount_price):
+            delta[key] += 1
+    delta.subtract((FacetCount.TAG, str(pk)) for pk in old_tag_ids)
+    delta.update((FacetCount.TAG, str(pk))
+                 for tag_ids in labels.values() for pk in tag_ids)
+    return delta
+
+
+def upsert_items(rows, slugs=None, start=0):
+    slugs = slugs or SlugCache()
+    results = [RowResult(index=start + i) for i in range(len(rows))]
+
+    existing = Item.objects.in_bulk(
+        {_slug(row) for row in rows if _slug(row)},
+        field_name='slug'
+    )
+    old_keys = {
+        item.pk: facets.scalar_keys(item.category_id, item.price,
+                                    item.discount_price)
+        for item in existing.values()
+    }
+    old_images = {item.pk: item.image.name for item in existing.values()}
+    to_create, to_update, labels = _prepare(rows, results, existing, slugs)
+
+    now = timezone.now()
+    for item in to_update:
+        item.updated_at = now
+    with transaction.atomic():
+        Item.objects.bulk_create(to_create)
+        if to_update:
+            Item.objects.bulk_update(to_update,
+                                     ITEM_FIELDS + ('updated_at',))
+        ids = dict(Item.objects.filter(
+            slug__in=[item.slug for item in to_create + to_update]
+        ).values_list('slug', 'id'))
+
+        old_labels = Through.objects.filter(
+            item_id__in=[ids[slug] for slug in labels]
+        )
+        old_tag_ids = list(old_labels.values_list('tag_id', flat=True))
+        old_labels.delete()
+        Through.objects.bulk_create(
+            Through(item_id=ids[slug], tag_id=tag_id)
+            for slug, tag_ids in labels.items()
+            for tag_id in tag_ids
+        )
+        facets.apply(_facet_delta(to_create + to_update, old_keys,
+                                  old_tag_ids, labels))
+        Order.objects.filter(
+            ordered=False, items__item__in=[item.pk for item in to_update]
+        ).refresh_totals()
+        # Bulk writes skip item_image_receiver.
+        jobs.enqueue_many('render_item_images', [
+            {'item_id': ids[item.slug], 'name': item.image.name}
+            for item in to_create + to_update
+            if item.image and item.image.name != old_images.get(item.pk)
+        ])
+
+    for result in results:
+        if result.ok:
+            result.id = ids[result.slug]
+    bump_item_versions(ids.values())
+    return results
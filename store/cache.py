@@ -0,0 +1,81 @@
+import time
+from uuid import uuid4
+
+from django.core.cache import cache, caches
+from django.db import transaction
+
+from store.models import Category
+
+FRAGMENT_CACHE = 'fragments'
+ITEM_VERSION_KEY = 'item-version:{}'
+CARD_KEY = 'card:{template}:{pk}:{version}'
+CATEGORIES_KEY = 'categories'
+# How long a process trusts its own copy before re-checking the shared one.
+CATEGORIES_LOCAL_TTL = 5
+
+_local_categories = {'version': None, 'categories': None, 'checked_at': 0}
+
+
+def _new_version():
+    return uuid4().hex[:12]
+
+
+def get_item_versions(ids):
+    keys = {ITEM_VERSION_KEY.format(pk): pk for pk in ids}
+    found = cache.get_many(keys)
+    missing = {key: _new_version() for key in keys if key not in found}
+    if missing:
+        cache.set_many(missing, timeout=None)
+        found.update(missing)
+    return {pk: found[key] for key, pk in keys.items()}
+
+
+def bump_item_versions(ids):
+    # After commit: a request rendering in between would cache the old
+    # rows under the new version for good. The ids are read now, before
+    # e.g. a delete changes what a queryset of them returns.
+    keys = [ITEM_VERSION_KEY.format(pk) for pk in ids]
+    transaction.on_commit(lambda: cache.set_many(
+        {key: _new_version() for key in keys}, timeout=None
+    ))
+
+
+def get_cached_cards(items, template_name):
+    versions = get_item_versions([item.pk for item in items])
+    keys = {
+        item.pk: CARD_KEY.format(template=template_name, pk=item.pk,
+                                 version=versions[item.pk])
+        for item in items
+    }
+    found = caches[FRAGMENT_CACHE].get_many(keys.values())
+    return keys, found
+
+
+def set_cached_cards(cards):
+    caches[FRAGMENT_CACHE].set_many(cards)
+
+
+def get_categories():
+    now = time.monotonic()
+    if (_local_categories['categories'] is not None
+            and now - _local_categories['checked_at'] < CATEGORIES_LOCAL_TTL):
+        return _local_categories['categories']
+
+    shared = cache.get(CATEGORIES_KEY)
+    if shared is None:
+        # Always from the primary: a lagging replica would cache the old
+        # list right after invalidate_categories() until the next change.
+        shared = (_new_version(),
+                  list(Category.objects.using('default').all()))
+        cache.set(CATEGORIES_KEY, shared, timeout=None)
+
+    version, categories = shared
+    if version != _local_categories['version']:
+        _local_categories.update(version=version, categories=categories)
+    _local_categories['checked_at'] = now
+    return _local_categories['categories']
+
+
+def invalidate_categories():
+    cache.delete(CATEGORIES_KEY)
+    _local_categories.update(version=None, categories=None, checked_at=0)
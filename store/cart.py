@@ -0,0 +1,399 @@
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from django.utils.connection import ConnectionProxy
+
+from store import coupons, pricing, stock
+from store.models import Item, Order, OrderItem, Stock, User
+
+logger = logging.getLogger(__name__)
+
+Through = Order.items.through
+
+# Kept apart from the default cache, which may evict; see CACHES.
+CART_CACHE = 'carts'
+cache = ConnectionProxy(caches, CART_CACHE)
+
+ADDED = 'added'
+UPDATED = 'updated'
+REMOVED = 'removed'
+OUT_OF_STOCK = 'out-of-stock'
+
+SESSION_KEY = 'cart_id'
+CART_KEY = 'cart:{}'
+COUNT_KEY = 'cart-count:{}'
+# Write-behind bookkeeping, see _mark_dirty() and flush().
+DIRTY_KEY = 'cart-dirty:{}'
+DIRTY_SEQ_KEY = 'cart-dirty-seq'
+DIRTY_LOG_KEY = 'cart-dirty-log:{}'
+DIRTY_CURSOR_KEY = 'cart-dirty-cursor'
+DIRTY_RETRY_KEY = 'cart-dirty-retry'
+FLUSH_KEY = 'cart-flush'
+# A cart whose log entry was lost is logged again by its next change
+# after this long.
+DIRTY_TIMEOUT = 60 * 10
+LOCK_KEY = 'lock:{}'
+# Locks expire on their own, so a crashed holder blocks others at most
+# this long.
+LOCK_TIMEOUT = 5
+
+
+class Cart:
+    # Read model of a cart: unsaved OrderItem lines with their items
+    # loaded and store.pricing prices attached.
+    def __init__(self, lines, coupon=None):
+        self.lines = lines
+        self.coupon = coupon
+
+    def __len__(self):
+        return len(self.lines)
+
+    def get_total(self):
+        total = pricing.total(line.prices for line in self.lines)
+        if self.coupon:
+            total -= self.coupon.amount
+        return total
+
+
+# Locks held by the current context, so checkout can hold a cart's lock
+# across materialize(), which takes it too.
+_held = ContextVar('cart_locks', default=frozenset())
+
+
+@contextmanager
+def _lock(key):
+    if key in _held.get():
+        yield
+        return
+    lock_key = LOCK_KEY.format(key)
+    while not cache.add(lock_key, 1, LOCK_TIMEOUT):
+        time.sleep(0.005)
+    token = _held.set(_held.get() | {key})
+    try:
+        yield
+    finally:
+        _held.reset(token)
+        cache.delete(lock_key)
+
+
+def locked(user):
+    # Keeps the user's cart from changing, or being written by flush(),
+    # until the block ends.
+    return _lock(user_cart_id(user))
+
+
+def _empty():
+    return {'lines': {}, 'coupon': None}
+
+
+def _save(cart_id, data):
+    cache.set(CART_KEY.format(cart_id), data, settings.CART_TIMEOUT)
+    cache.set(COUNT_KEY.format(cart_id), len(data['lines']),
+              settings.CART_COUNT_TIMEOUT)
+
+
+def user_cart_id(user):
+    return f'user:{user.pk}'
+
+
+def get_cart_id(request, create=False):
+    if request.user.is_authenticated:
+        return user_cart_id(request.user)
+    cart_id = request.session.get(SESSION_KEY)
+    if cart_id is None and create:
+        cart_id = request.session[SESSION_KEY] = f'guest:{uuid4().hex}'
+    return cart_id
+
+
+def _load_from_db(user):
+    data = _empty()
+    data['lines'] = dict(OrderItem.objects.filter(
+        user=user, ordered=False
+    ).values_list('item_id', 'quantity'))
+    data['coupon'] = Order.objects.filter(
+        user=user, ordered=False
+    ).values_list('coupon_id', flat=True).first()
+    return data
+
+
+def load(cart_id, user=None):
+    # Read-through: a user's cart evicted from the cache is rebuilt from
+    # the open order the last write-behind left in the database.
+    if cart_id is None:
+        return _empty()
+    data = cache.get(CART_KEY.format(cart_id))
+    if data is None:
+        data = _load_from_db(user) if user is not None else _empty()
+        _save(cart_id, data)
+    return data
+
+
+def _next_dirty_number():
+    try:
+        return cache.incr(DIRTY_SEQ_KEY)
+    except ValueError:
+        cache.add(DIRTY_SEQ_KEY, 0, None)
+        return cache.incr(DIRTY_SEQ_KEY)
+
+
+def _mark_dirty(cart_id):
+    # Each cart has its own marker; only the first change after a flush
+    # appends the cart to a numbered log, which flush() reads by number.
+    # Nothing is shared between carts except the atomic counter.
+    if not cache.add(DIRTY_KEY.format(cart_id), 1, DIRTY_TIMEOUT):
+        return
+    cache.set(DIRTY_LOG_KEY.format(_next_dirty_number()), cart_id,
+              settings.CART_TIMEOUT)
+
+
+def _update(request, change):
+    user = request.user if request.user.is_authenticated else None
+    cart_id = get_cart_id(request, create=True)
+    with _lock(cart_id):
+        data = load(cart_id, user)
+        result = change(data)
+        _save(cart_id, data)
+    if user is not None:
+        _mark_dirty(cart_id)
+    return result
+
+
+def _item(slug):
+    # Returns (id, tracked): only items with a Stock row take reservations.
+    item = get_object_or_404(
+        Item.objects.only('id').annotate(
+            tracked=Exists(Stock.objects.filter(item=OuterRef('pk')))
+        ),
+        slug=slug
+    )
+    return item.id, item.tracked
+
+
+def add_item(request, slug, quantity=1):
+    item_id, tracked = _item(slug)
+    cart_id = get_cart_id(request, create=True)
+
+    def change(data):
+        if tracked and not stock.reserve(cart_id, item_id, quantity):
+            return OUT_OF_STOCK
+        status = UPDATED if item_id in data['lines'] else ADDED
+        data['lines'][item_id] = data['lines'].get(item_id, 0) + quantity
+        return status
+    return _update(request, change)
+
+
+def remove_item(request, slug):
+    item_id, tracked = _item(slug)
+    cart_id = get_cart_id(request, create=True)
+
+    def change(data):
+        if data['lines'].pop(item_id, None) is not None:
+            if tracked:
+                stock.release(cart_id, item_id)
+            return REMOVED
+    return _update(request, change)
+
+
+def decrement_item(request, slug):
+    item_id, tracked = _item(slug)
+    cart_id = get_cart_id(request, create=True)
+
+    def change(data):
+        quantity = data['lines'].get(item_id)
+        if quantity is None:
+            return None
+        if tracked:
+            stock.release(cart_id, item_id, 1)
+        if quantity > 1:
+            data['lines'][item_id] = quantity - 1
+            return UPDATED
+        del data['lines'][item_id]
+        return REMOVED
+    return _update(request, change)
+
+
+def set_coupon(request, coupon):
+    def change(data):
+        data['coupon'] = coupon.id if coupon else None
+    _update(request, change)
+
+
+def count(request):
+    # The badge reads a small counter kept next to the cart by every
+    # mutation; when it expires it is recomputed from the cart.
+    cart_id = get_cart_id(request)
+    if cart_id is None:
+        return 0
+    value = cache.get(COUNT_KEY.format(cart_id))
+    if value is None:
+        user = request.user if request.user.is_authenticated else None
+        value = len(load(cart_id, user)['lines'])
+        # add, not set: a mutation since load() has stored a newer count.
+        cache.add(COUNT_KEY.format(cart_id), value,
+                  settings.CART_COUNT_TIMEOUT)
+    return value
+
+
+def get_cart(request):
+    user = request.user if request.user.is_authenticated else None
+    data = load(get_cart_id(request), user)
+    items = Item.objects.in_bulk(data['lines'])
+    lines = pricing.attach(
+        OrderItem(user=user, item=items[item_id], quantity=quantity,
+                  ordered=False)
+        for item_id, quantity in data['lines'].items() if item_id in items
+    )
+    coupon = None
+    if data['coupon'] is not None:
+        coupon = coupons.get_by_id(data['coupon'])
+        if coupon is not None and not coupon.is_active():
+            coupon = None
+    return Cart(lines, coupon)
+
+
+def merge(request, user):
+    # Fold the guest cart of this session into the user's cart at login.
+    guest_id = request.session.pop(SESSION_KEY, None)
+    if guest_id is None:
+        return
+    guest = cache.get(CART_KEY.format(guest_id))
+    cache.delete_many([CART_KEY.format(guest_id), COUNT_KEY.format(guest_id)])
+    if not guest or not (guest['lines'] or guest['coupon']):
+        return
+    cart_id = user_cart_id(user)
+    with _lock(cart_id):
+        stock.transfer(guest_id, cart_id)
+        data = load(cart_id, user)
+        for item_id, quantity in guest['lines'].items():
+            data['lines'][item_id] = data['lines'].get(item_id, 0) + quantity
+        data['coupon'] = guest['coupon'] or data['coupon']
+        _save(cart_id, data)
+    _mark_dirty(cart_id)
+
+
+def get_open_order(user):
+    # At most one open order per user (unique_open_order), so the
+    # get-or-create is safe against concurrent writers.
+    order, _ = Order.objects.get_or_create(
+        user=user, ordered=False,
+        defaults={'ordered_date': timezone.now()}
+    )
+    return order
+
+
+def materialize(user):
+    # Write the cached cart into the user's open Order/OrderItem rows.
+    with locked(user):
+        return _materialize(user)
+
+
+def _materialize(user):
+    data = load(user_cart_id(user), user)
+    # Items deleted since they were put in the cart are dropped.
+    lines = {
+        item_id: data['lines'][item_id]
+        for item_id in Item.objects.filter(
+            id__in=data['lines']
+        ).values_list('id', flat=True)
+    }
+    if not lines:
+        OrderItem.objects.filter(user=user, ordered=False).delete()
+        return Order.objects.filter(user=user, ordered=False).first()
+    with transaction.atomic():
+        order = get_open_order(user)
+        if order.coupon_id != data['coupon']:
+            order.coupon_id = data['coupon']
+            order.save(update_fields=['coupon'])
+
+        current = {line.item_id: line for line in OrderItem.objects.filter(
+            user=user, ordered=False
+        )}
+        OrderItem.objects.filter(id__in=[
+            line.id for item_id, line in current.items()
+            if item_id not in lines
+        ]).delete()
+        changed = []
+        for item_id, line in current.items():
+            if item_id in lines and line.quantity != lines[item_id]:
+                line.quantity = lines[item_id]
+                changed.append(line)
+        OrderItem.objects.bulk_update(changed, ['quantity'])
+        OrderItem.objects.bulk_create(
+            OrderItem(user=user, item_id=item_id, ordered=False,
+                      quantity=quantity)
+            for item_id, quantity in lines.items()
+            if item_id not in current
+        )
+        line_ids = OrderItem.objects.filter(
+            user=user, ordered=False
+        ).values_list('id', flat=True)
+        Through.objects.bulk_create(
+            [Through(order_id=order.id, orderitem_id=pk) for pk in line_ids],
+            ignore_conflicts=True
+        )
+        # Bulk writes skip the totals receivers.
+        Order.objects.filter(pk=order.pk).refresh_totals()
+    return order
+
+
+def clear(user):
+    cart_id = user_cart_id(user)
+    cache.delete_many([CART_KEY.format(cart_id), COUNT_KEY.format(cart_id)])
+
+
+def _dirty_carts():
+    # Reads the log entries numbered since the last flush. An entry whose
+    # writer took the number but has not stored it yet is looked for once
+    # more by the next flush.
+    last = cache.get(DIRTY_SEQ_KEY, 0)
+    cursor = cache.get(DIRTY_CURSOR_KEY, 0)
+    if last < cursor:
+        # The cart cache was cleared and the counter started over.
+        cursor = 0
+    retry = cache.get(DIRTY_RETRY_KEY, [])
+    keys = {DIRTY_LOG_KEY.format(number): number
+            for number in retry + list(range(cursor + 1, last + 1))}
+    found = {}
+    names = list(keys)
+    for start in range(0, len(names), 1000):
+        found.update(cache.get_many(names[start:start + 1000]))
+    cache.set_many({
+        DIRTY_CURSOR_KEY: last,
+        DIRTY_RETRY_KEY: [number for key, number in keys.items()
+                          if key not in found and number > cursor],
+    }, None)
+    cache.delete_many(list(found))
+    cart_ids = set(found.values())
+    # Later changes mark and log the cart again, so they are not lost
+    # even while it is being written below.
+    cache.delete_many([DIRTY_KEY.format(cart_id) for cart_id in cart_ids])
+    return cart_ids
+
+
+def flush():
+    # Write-behind: persist every user cart changed since the last flush.
+    # Only concurrent flushes wait for each other.
+    with _lock(FLUSH_KEY):
+        dirty = _dirty_carts()
+    users = User.objects.in_bulk([
+        int(cart_id.split(':')[1]) for cart_id in dirty
+        if cart_id.startswith('user:')
+    ])
+    for user in users.values():
+        try:
+            materialize(user)
+        except Exception:
+            # The rest of the batch still gets written; this cart is
+            # tried again by the next flush.
+            logger.exception('Could not write the cart of user %s', user.pk)
+            _mark_dirty(user_cart_id(user))
+    return len(users)
@@ -0,0 +1,85 @@
+import string
+
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from django.utils.crypto import get_random_string
+
+from store import cart, coupons, jobs, pricing, stock
+from store.models import Address, Order, OrderItem
+
+REF_CODE_CHARS = string.ascii_uppercase + string.digits
+REF_CODE_LENGTH = 20
+
+
+class EmptyCart(Exception):
+    pass
+
+
+def generate_ref_code():
+    return get_random_string(REF_CODE_LENGTH, REF_CODE_CHARS)
+
+
+def find_placed(user, idempotency_key):
+    if not idempotency_key:
+        return None
+    return Order.objects.filter(user=user, ordered=True,
+                                idempotency_key=idempotency_key).first()
+
+
+def place_order(user, shipping, idempotency_key=None):
+    # Returns (order, created). A retry with an idempotency key that
+    # already placed an order returns that order after a single lookup.
+    placed = find_placed(user, idempotency_key)
+    if placed is not None:
+        return placed, False
+    # The cart lock keeps additions to the cart and write-behind flushes
+    # out until the ordered cart is cleared.
+    with cart.locked(user):
+        try:
+            with transaction.atomic():
+                order = _place(user, shipping, idempotency_key)
+        except (EmptyCart, IntegrityError):
+            # A parallel request with the same key committed first: this
+            # one then finds the cart already ordered or hits the unique
+            # key.
+            placed = find_placed(user, idempotency_key)
+            if placed is None:
+                raise
+            return placed, False
+        transaction.on_commit(lambda: cart.clear(user))
+    order.refresh_from_db(fields=['total', 'item_count'])
+    return order, True
+
+
+def _place(user, shipping, idempotency_key):
+    order = cart.materialize(user)
+    if order is None:
+        raise EmptyCart
+    order = (Order.objects.select_for_update().select_related('coupon')
+             .get(pk=order.pk))
+    if order.ordered:
+        raise EmptyCart
+
+    lines = pricing.snapshot(OrderItem.objects.filter(order=order))
+    if not lines:
+        raise EmptyCart
+    stock.consume(cart.user_cart_id(user),
+                  {line.item_id: line.quantity for line in lines})
+    for line in lines:
+        line.ordered = True
+    OrderItem.objects.bulk_update(lines,
+                                  ['price', 'discount_price', 'ordered'])
+
+    order.shipping_address = Address.objects.create(user=user, **shipping)
+    order.coupon_amount = order.coupon.amount if order.coupon else None
+    order.ordered = True
+    order.ordered_date = timezone.now()
+    order.ref_code = generate_ref_code()
+    order.idempotency_key = idempotency_key or None
+    if order.coupon:
+        # Last, so the coupon's counter row stays locked only briefly.
+        coupons.redeem(order.coupon, user)
+    # post_save recomputes the stored totals from the snapshot.
+    order.save()
+    jobs.enqueue('send_order_confirmation', {'order_id': order.pk})
+    return order
@@ -0,0 +1,5 @@
+from store.cache import get_categories
+
+
+def categories(request):
+    return {'categories': get_categories()}
@@ -0,0 +1,112 @@
+from hashlib import md5
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F, Q
+
+from store.models import Coupon, CouponRedemption
+
+VERSION_KEY = 'coupons-version'
+CODE_KEY = 'coupon:{version}:{code}'
+ID_KEY = 'coupon-id:{version}:{pk}'
+FAILURES_KEY = 'coupon-failures:{}'
+# Cached in place of a coupon for codes that do not exist.
+MISSING = 'missing'
+
+NOT_FOUND = 'not-found'
+INACTIVE = 'inactive'
+USED_UP = 'used-up'
+THROTTLED = 'throttled'
+
+
+class CouponUnavailable(Exception):
+    pass
+
+
+def _version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, uuid4().hex[:12], None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def invalidate():
+    # Any coupon change drops every cached lookup, hits and misses alike.
+    cache.delete(VERSION_KEY)
+
+
+def _cached(key, load, missing_timeout):
+    coupon = cache.get(key)
+    if coupon is None:
+        coupon = load() or MISSING
+        cache.set(key, coupon, missing_timeout if coupon == MISSING
+                  else settings.COUPON_CACHE_TIMEOUT)
+    return None if coupon == MISSING else coupon
+
+
+def get_by_code(code):
+    # Codes come from users: hash them into a key any backend accepts.
+    digest = md5(code.encode()).hexdigest()
+    return _cached(CODE_KEY.format(version=_version(), code=digest),
+                   lambda: Coupon.objects.filter(code=code).first(),
+                   settings.COUPON_MISS_TIMEOUT)
+
+
+def get_by_id(pk):
+    return _cached(ID_KEY.format(version=_version(), pk=pk),
+                   lambda: Coupon.objects.filter(pk=pk).first(),
+                   settings.COUPON_CACHE_TIMEOUT)
+
+
+def _client_key(request):
+    if request.user.is_authenticated:
+        return FAILURES_KEY.format(f'user:{request.user.pk}')
+    return FAILURES_KEY.format(request.META.get('REMOTE_ADDR'))
+
+
+def lookup(request, code):
+    # Returns (coupon, error). Clients that keep entering unknown codes
+    # are turned away before the lookup for COUPON_FAILURE_WINDOW.
+    failures = _client_key(request)
+    if cache.get(failures, 0) >= settings.COUPON_MAX_FAILURES:
+        return None, THROTTLED
+    coupon = get_by_code(code.strip())
+    if coupon is None:
+        try:
+            cache.incr(failures)
+        except ValueError:
+            # First failure, or the window ran out since the check above.
+            cache.set(failures, 1, settings.COUPON_FAILURE_WINDOW)
+        return None, NOT_FOUND
+    if not coupon.is_active():
+        return None, INACTIVE
+    # uses may lag in the cache; redeem() has the final word.
+    if coupon.is_used_up():
+        return None, USED_UP
+    return coupon, None
+
+
+def redeem(coupon, user):
+    # Runs in the checkout transaction. Both counters are conditional
+    # increments, so concurrent checkouts cannot overshoot either limit.
+    if not coupon.is_active():
+        raise CouponUnavailable
+    if not Coupon.objects.filter(
+        Q(max_uses__isnull=True) | Q(uses__lt=F('max_uses')), pk=coupon.pk
+    ).update(uses=F('uses') + 1):
+        raise CouponUnavailable
+    if coupon.max_uses is not None and coupon.uses + 1 >= coupon.max_uses:
+        # The last use is gone: cached copies must stop offering it.
+        transaction.on_commit(invalidate)
+
+    CouponRedemption.objects.bulk_create(
+        [CouponRedemption(coupon=coupon, user=user)], ignore_conflicts=True
+    )
+    redemption = CouponRedemption.objects.filter(coupon=coupon, user=user)
+    if coupon.max_uses_per_user is not None:
+        redemption = redemption.filter(uses__lt=coupon.max_uses_per_user)
+    if not redemption.update(uses=F('uses') + 1):
+        raise CouponUnavailable
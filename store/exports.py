@@ -0,0 +1,135 @@
+import csv
+import json
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import F
+
+from store.models import Item, Order
+
+ItemTags = Item.label.through
+OrderLines = Order.items.through
+
+ITEM_FIELDS = ('id', 'slug', 'title', 'price', 'discount_price', 'category',
+               'tags', 'description', 'image', 'created_at')
+ORDER_FIELDS = ('id', 'ref_code', 'user', 'ordered', 'start_date',
+                'ordered_date', 'status', 'coupon', 'total', 'order_item',
+                'item', 'quantity', 'price', 'discount_price')
+
+
+def iter_chunks(queryset, chunk_size=None):
+    # Seek by primary key: every chunk is one bounded query, so neither
+    # the database nor Python ever holds more than chunk_size rows.
+    chunk_size = chunk_size or settings.EXPORT_CHUNK_SIZE
+    last_pk = 0
+    while True:
+        chunk = list(queryset.filter(pk__gt=last_pk)
+                     .order_by('pk')[:chunk_size])
+        if not chunk:
+            return
+        yield chunk
+        last_pk = chunk[-1]['id']
+
+
+def iter_items(chunk_size=None):
+    queryset = Item.objects.values(
+        'id', 'slug', 'title', 'price', 'discount_price', 'description',
+        'image', 'created_at', category_slug=F('category__slug'),
+    )
+    for chunk in iter_chunks(queryset, chunk_size):
+        tags = {}
+        for item_id, slug in (ItemTags.objects
+                              .filter(item_id__in=[row['id']
+                                                   for row in chunk])
+                              .order_by('tag__slug')
+                              .values_list('item_id', 'tag__slug')):
+            tags.setdefault(item_id, []).append(slug)
+        for row in chunk:
+            row['category'] = row.pop('category_slug')
+            row['tags'] = '|'.join(tags.get(row['id'], ()))
+            yield row
+
+
+def iter_orders(chunk_size=None):
+    # One row per order line; orders without lines get a single row with
+    # empty line columns.
+    queryset = Order.objects.values(
+        'id', 'ref_code', 'ordered', 'start_date', 'ordered_date', 'total',
+        username=F('user__username'), status_name=F('status__name'),
+        coupon_code=F('coupon__code'),
+    )
+    for chunk in iter_chunks(queryset, chunk_size):
+        lines = {}
+        for line in (OrderLines.objects
+                     .filter(order_id__in=[row['id'] for row in chunk])
+                     .order_by('orderitem_id')
+                     .values('order_id', 'orderitem_id',
+                             'orderitem__quantity',
+                             'orderitem__item__slug',
+                             'orderitem__price',
+                             'orderitem__discount_price',
+                             'orderitem__item__price',
+                             'orderitem__item__discount_price')):
+            # Placed lines carry their checkout prices, which the order
+            # total was computed from; older lines fall back to the item.
+            prefix = ('orderitem__' if line['orderitem__price'] is not None
+                      else 'orderitem__item__')
+            lines.setdefault(line['order_id'], []).append({
+                'order_item': line['orderitem_id'],
+                'item': line['orderitem__item__slug'],
+                'quantity': line['orderitem__quantity'],
+                'price': line[f'{prefix}price'],
+                'discount_price': line[f'{prefix}discount_price'],
+            })
+        for row in chunk:
+            order = {
+                'id': row['id'],
+                'ref_code': row['ref_code'],
+                'user': row['username'],
+                'ordered': row['ordered'],
+                'start_date': row['start_date'],
+                'ordered_date': row['ordered_date'],
+                'status': row['status_name'],
+                'coupon': row['coupon_code'],
+                'total': row['total'],
+            }
+            for line in lines.get(row['id']) or [{}]:
+                yield {**order, **line}
+
+
+class Echo:
+    def write(self, value):
+        return value
+
+
+def to_csv(rows, fields):
+    writer = csv.DictWriter(Echo(), fields, extrasaction='ignore')
+    yield writer.writeheader()
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def to_ndjson(rows, fields):
+    for row in rows:
+        yield json.dumps({name: row.get(name) for name in fields},
+                         cls=DjangoJSONEncoder, ensure_ascii=False) + '\n'
+
+
+EXPORTS = {
+    'items': (iter_items, ITEM_FIELDS),
+    'orders': (iter_orders, ORDER_FIELDS),
+}
+FORMATS = {
+    'csv': (to_csv, 'text/csv'),
+    'ndjson': (to_ndjson, 'application/x-ndjson'),
+}
+
+
+def export(name, fmt, chunk_size=None):
+    rows, fields = EXPORTS[name]
+    writer, _ = FORMATS[fmt]
+    return writer(rows(chunk_size), fields)
+
+
+def content_type(fmt):
+    return FORMATS[fmt][1]
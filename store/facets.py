@@ -0,0 +1,160 @@
+from bisect import bisect_right
+from collections import Counter
+from functools import reduce
+from operator import or_
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, Count, F, IntegerField, Q, Value, When
+from django.db.models.functions import Coalesce, NullIf
+
+from store.models import FacetCount, Item
+
+Through = Item.label.through
+
+
+def final_price(price, discount_price):
+    return discount_price or price
+
+
+def price_bucket(price):
+    return bisect_right(settings.PRICE_FACETS, price)
+
+
+def price_range(bucket):
+    bounds = (0,) + tuple(settings.PRICE_FACETS) + (None,)
+    return bounds[bucket], bounds[bucket + 1]
+
+
+def price_buckets():
+    return range(len(settings.PRICE_FACETS) + 1)
+
+
+def scalar_keys(category_id, price, discount_price):
+    keys = {(FacetCount.PRICE,
+             str(price_bucket(final_price(price, discount_price))))}
+    if category_id is not None:
+        keys.add((FacetCount.CATEGORY, str(category_id)))
+    return keys
+
+
+def tag_keys(tag_ids):
+    return {(FacetCount.TAG, str(pk)) for pk in tag_ids}
+
+
+def _key_filter(keys):
+    return reduce(or_, (Q(facet=facet, value=value)
+                        for facet, value in keys))
+
+
+def apply(delta):
+    # delta maps (facet, value) to the change of its items count.
+    delta = {key: change for key, change in delta.items() if change}
+    if not delta:
+        return
+    with transaction.atomic():
+        FacetCount.objects.bulk_create(
+            [FacetCount(facet=facet, value=value)
+             for facet, value in delta],
+            ignore_conflicts=True
+        )
+        by_change = {}
+        for key, change in delta.items():
+            by_change.setdefault(change, set()).add(key)
+        for change, keys in by_change.items():
+            FacetCount.objects.filter(_key_filter(keys)).update(
+                count=F('count') + change
+            )
+
+
+def apply_diff(removed, added):
+    delta = Counter()
+    for key in added - removed:
+        delta[key] += 1
+    for key in removed - added:
+        delta[key] -= 1
+    apply(delta)
+
+
+def forget(facet, value):
+    FacetCount.objects.filter(facet=facet, value=str(value)).delete()
+
+
+def rebuild():
+    delta = Counter()
+    for item in Item.objects.values('category_id', 'price',
+                                    'discount_price').iterator():
+        for key in scalar_keys(item['category_id'], item['price'],
+                               item['discount_price']):
+            delta[key] += 1
+    for row in Through.objects.values('tag_id').annotate(n=Count('id')):
+        delta[(FacetCount.TAG, str(row['tag_id']))] = row['n']
+    with transaction.atomic():
+        FacetCount.objects.all().delete()
+        FacetCount.objects.bulk_create(
+            FacetCount(facet=facet, value=value, count=count)
+            for (facet, value), count in delta.items()
+        )
+
+
+def with_price_bucket(queryset):
+    bounds = settings.PRICE_FACETS
+    return queryset.annotate(
+        final_price=Coalesce(NullIf('discount_price', Value(0.0)), 'price'),
+        price_bucket=Case(
+            *[When(final_price__lt=bound, then=Value(bucket))
+              for bucket, bound in enumerate(bounds)],
+            default=Value(len(bounds)),
+            output_field=IntegerField(),
+        ),
+    )
+
+
+def filter_items(queryset, categories=(), tags=(), prices=(), skip=None):
+    if categories and skip != FacetCount.CATEGORY:
+        queryset = queryset.filter(category_id__in=categories)
+    if tags and skip != FacetCount.TAG:
+        queryset = queryset.filter(id__in=Through.objects.filter(
+            tag_id__in=tags
+        ).values('item_id'))
+    if prices and skip != FacetCount.PRICE:
+        queryset = with_price_bucket(queryset).filter(
+            price_bucket__in=prices
+        )
+    return queryset
+
+
+def get_counts(queryset, categories=(), tags=(), prices=()):
+    # Unfiltered pages read the maintained table; once something is
+    # selected, each facet is counted with one GROUP BY over the items
+    # matching every other facet's selection.
+    counts = {facet: {} for facet, _ in FacetCount.FACET_CHOICES}
+    if not (categories or tags or prices):
+        for row in FacetCount.objects.filter(count__gt=0):
+            counts[row.facet][row.value] = row.count
+        return counts
+
+    selected = {'categories': categories, 'tags': tags, 'prices': prices}
+    rows = (
+        filter_items(queryset, skip=FacetCount.CATEGORY, **selected)
+        .order_by().values('category_id').annotate(n=Count('id'))
+    )
+    counts[FacetCount.CATEGORY] = {
+        str(row['category_id']): row['n'] for row in rows
+    }
+    rows = (
+        Through.objects.filter(item__in=filter_items(
+            queryset, skip=FacetCount.TAG, **selected
+        ).order_by().values('id'))
+        .values('tag_id').annotate(n=Count('id'))
+    )
+    counts[FacetCount.TAG] = {str(row['tag_id']): row['n'] for row in rows}
+    rows = (
+        with_price_bucket(filter_items(queryset, skip=FacetCount.PRICE,
+                                       **selected))
+        .order_by().values('price_bucket').annotate(n=Count('id'))
+    )
+    counts[FacetCount.PRICE] = {
+        str(row['price_bucket']): row['n'] for row in rows
+    }
+    return counts
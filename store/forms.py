@@ -32,6 +32,11 @@ class CheckoutForm(forms.Form):
         required=False
     )
     set_default_shipping = forms.BooleanField(required=False)
+    idempotency_key = forms.CharField(
+        widget=forms.HiddenInput,
+        max_length=64,
+        required=False
+    )
 
 
 class CouponForm(forms.Form):
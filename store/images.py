@@ -0,0 +1,103 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path, PurePosixPath
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from PIL import Image, ImageSequence
+
+DERIVATIVES_DIR = 'derivatives'
+WEBP = '.webp'
+
+_executor = None
+
+
+def derivative_name(name, size, ext=None):
+    path = PurePosixPath(name)
+    width = settings.IMAGE_SIZES[size]
+    return str(PurePosixPath(DERIVATIVES_DIR, path.parent,
+                             f'{path.stem}_{width}{ext or path.suffix}'))
+
+
+def _resize(image, width):
+    frames, durations = [], []
+    for frame in ImageSequence.Iterator(image):
+        durations.append(frame.info.get('duration',
+                                        image.info.get('duration', 100)))
+        frame = frame.convert('RGBA')
+        frame.thumbnail((width, width), Image.LANCZOS)
+        frames.append(frame)
+    return frames, durations
+
+
+def _save(frames, durations, target, fmt):
+    target.parent.mkdir(parents=True, exist_ok=True)
+    options = {'format': fmt}
+    if len(frames) > 1:
+        options.update(save_all=True, append_images=frames[1:],
+                       duration=durations, loop=0)
+    first = frames[0]
+    if fmt == 'JPEG':
+        first = first.convert('RGB')
+    elif fmt == 'WEBP':
+        options.update(quality=80, method=4)
+    first.save(target, **options)
+
+
+def render_derivatives(source, targets, force=False):
+    # Runs in a pool process: plain paths in, nothing Django-specific.
+    source = Path(source)
+    pending = [
+        (width, Path(path), Path(webp_path))
+        for width, path, webp_path in targets
+        if force or not (Path(path).exists() and Path(webp_path).exists())
+    ]
+    if not pending:
+        return 0
+    with Image.open(source) as image:
+        fmt = image.format
+        for width, path, webp_path in pending:
+            frames, durations = _resize(image, width)
+            _save(frames, durations, path, fmt)
+            _save(frames, durations, webp_path, 'WEBP')
+    return len(pending)
+
+
+def get_targets(name):
+    return [
+        (width,
+         default_storage.path(derivative_name(name, size)),
+         default_storage.path(derivative_name(name, size, WEBP)))
+        for size, width in settings.IMAGE_SIZES.items()
+    ]
+
+
+def get_executor(workers=None):
+    global _executor
+    if workers is not None:
+        return ProcessPoolExecutor(max_workers=workers)
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=settings.IMAGE_WORKERS)
+    return _executor
+
+
+def submit(name, executor=None, force=False):
+    executor = executor or get_executor()
+    return executor.submit(render_derivatives, default_storage.path(name),
+                           get_targets(name), force)
+
+
+def srcset(name, ext=None):
+    entries = []
+    for size, width in settings.IMAGE_SIZES.items():
+        derivative = derivative_name(name, size, ext)
+        if os.path.exists(default_storage.path(derivative)):
+            entries.append(f'{default_storage.url(derivative)} {width}w')
+    return ', '.join(entries)
+
+
+def url(name, size):
+    derivative = derivative_name(name, size)
+    if os.path.exists(default_storage.path(derivative)):
+        return default_storage.url(derivative)
+    return default_storage.url(name)
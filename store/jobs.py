@@ -0,0 +1,151 @@
+import logging
+import random
+import time
+import traceback
+from datetime import timedelta
+from uuid import uuid4
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from store.models import Job
+
+logger = logging.getLogger(__name__)
+
+TASKS = {}
+
+
+def task(name=None, max_attempts=None):
+    def register(func):
+        func.max_attempts = max_attempts
+        TASKS[name or func.__name__] = func
+        return func
+    return register
+
+
+def enqueue(name, payload=None, delay=0):
+    # The job row is written in the caller's transaction, so it is only
+    # picked up once whatever it refers to has been committed.
+    if name not in TASKS:
+        raise ValueError(f'Unknown task "{name}"')
+    return Job.objects.create(
+        name=name,
+        payload=payload or {},
+        max_attempts=TASKS[name].max_attempts or settings.JOB_MAX_ATTEMPTS,
+        run_at=timezone.now() + timedelta(seconds=delay),
+    )
+
+
+def enqueue_many(name, payloads, delay=0):
+    if name not in TASKS:
+        raise ValueError(f'Unknown task "{name}"')
+    run_at = timezone.now() + timedelta(seconds=delay)
+    max_attempts = TASKS[name].max_attempts or settings.JOB_MAX_ATTEMPTS
+    return Job.objects.bulk_create(
+        [Job(name=name, payload=payload, max_attempts=max_attempts,
+             run_at=run_at) for payload in payloads],
+        batch_size=500
+    )
+
+
+def backoff(attempts):
+    delay = min(settings.JOB_RETRY_DELAY * 2 ** (attempts - 1),
+                settings.JOB_MAX_RETRY_DELAY)
+    return timedelta(seconds=delay * random.uniform(1, 1.25))
+
+
+def claim(worker, batch):
+    now = timezone.now()
+    token = f'{worker}:{uuid4().hex[:8]}'
+    due = Job.objects.filter(status=Job.PENDING, run_at__lte=now)
+    if connection.features.has_select_for_update_skip_locked:
+        with transaction.atomic():
+            ids = list(due.select_for_update(skip_locked=True)
+                       .values_list('id', flat=True)[:batch])
+            Job.objects.filter(id__in=ids).update(
+                status=Job.RUNNING, locked_by=token, locked_at=now
+            )
+    else:
+        # Without SKIP LOCKED workers may pick the same ids; the
+        # conditional UPDATE hands each row to only one of them.
+        ids = list(due.values_list('id', flat=True)[:batch])
+        Job.objects.filter(id__in=ids, status=Job.PENDING).update(
+            status=Job.RUNNING, locked_by=token, locked_at=now
+        )
+    return list(Job.objects.filter(status=Job.RUNNING, locked_by=token))
+
+
+def run(job):
+    job.attempts += 1
+    try:
+        func = TASKS.get(job.name)
+        if func is None:
+            raise LookupError(f'Unknown task "{job.name}"')
+        with transaction.atomic():
+            func(**job.payload)
+    except Exception:
+        logger.exception('Job %s failed (attempt %s of %s)',
+                         job, job.attempts, job.max_attempts)
+        job.last_error = traceback.format_exc()
+        if job.attempts < job.max_attempts:
+            job.status = Job.PENDING
+            job.run_at = timezone.now() + backoff(job.attempts)
+        else:
+            job.status = Job.FAILED
+            job.finished_at = timezone.now()
+    else:
+        job.status = Job.DONE
+        job.finished_at = timezone.now()
+    job.locked_by, job.locked_at = '', None
+    job.save(update_fields=['attempts', 'status', 'run_at', 'last_error',
+                            'finished_at', 'locked_by', 'locked_at'])
+    return job.status == Job.DONE
+
+
+def release_stale():
+    # Jobs of a worker that died mid-run go back to the queue; the lost
+    # run counts as an attempt.
+    stale = Job.objects.filter(
+        status=Job.RUNNING,
+        locked_at__lt=timezone.now() - timedelta(
+            seconds=settings.JOB_LOCK_TIMEOUT
+        ),
+    )
+    stale.filter(attempts__gte=F('max_attempts') - 1).update(
+        status=Job.FAILED, attempts=F('attempts') + 1,
+        finished_at=timezone.now(), locked_by='', locked_at=None
+    )
+    return stale.update(status=Job.PENDING, attempts=F('attempts') + 1,
+                        locked_by='', locked_at=None)
+
+
+def purge():
+    return Job.objects.filter(
+        status=Job.DONE,
+        finished_at__lt=timezone.now() - timedelta(
+            seconds=settings.JOB_KEEP_DONE
+        ),
+    ).delete()[0]
+
+
+def work(worker, batch=None, once=False, sleep=1.0, stop=None):
+    # Claims and runs due jobs until stop() is true; with once=True it
+    # returns as soon as the queue has nothing due.
+    batch = batch or settings.JOB_BATCH_SIZE
+    stop = stop or (lambda: False)
+    processed = 0
+    while not stop():
+        close_old_connections()
+        jobs = claim(worker, batch)
+        for job in jobs:
+            run(job)
+        processed += len(jobs)
+        if not jobs:
+            release_stale()
+            purge()
+            if once:
+                break
+            time.sleep(sleep)
+    return processed
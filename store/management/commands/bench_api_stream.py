@@ -0,0 +1,72 @@
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.urls import reverse
+
+from store.benchmarks import (benchmark_client,
+                              forget_seed,
+                              seed_catalog,
+                              seed_orders)
+
+
+class Command(BaseCommand):
+    help = ('Seed orders inside a rolled back transaction and fetch them '
+            'from the API as one JSON document and as an NDJSON stream; '
+            'report time to first byte, total time and peak Python memory '
+            'for each. store.tests checks that both carry the same orders.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--orders', type=int, default=10000)
+        parser.add_argument('--lines', type=int, default=3,
+                            help='Lines per order.')
+
+    def handle(self, *args, **options):
+        catalog = None
+        try:
+            with transaction.atomic():
+                catalog = seed_catalog(items=50, categories=2, tags=2)
+                user = seed_orders(catalog['items'], options['orders'],
+                                   options['lines'], catalog['prefix'])
+                self.run(user)
+                transaction.set_rollback(True)
+        finally:
+            if catalog is not None:
+                forget_seed(catalog)
+
+    def measure(self, name, fetch):
+        tracemalloc.start()
+        started = time.perf_counter()
+        first_byte, orders = None, 0
+        # Chunks are counted and dropped, as a consumer writing them out
+        # would.
+        for chunk in fetch():
+            if first_byte is None:
+                first_byte = time.perf_counter() - started
+            orders += chunk.count(b'"ref_code"')
+        elapsed = time.perf_counter() - started
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        return name, first_byte or elapsed, elapsed, peak, orders
+
+    def run(self, user):
+        client, isolated = benchmark_client(user)
+        url = reverse('api:orders-list')
+
+        def document():
+            yield client.get(url, HTTP_ACCEPT='application/json').content
+
+        def stream():
+            response = client.get(url, HTTP_ACCEPT='application/x-ndjson')
+            yield from response.streaming_content
+
+        with isolated:
+            results = [self.measure('json', document),
+                       self.measure('ndjson', stream)]
+        self.stdout.write(f'{"format":<8}{"first byte s":>14}'
+                          f'{"total s":>9}{"peak MB":>9}{"orders":>9}')
+        for name, first_byte, elapsed, peak, orders in results:
+            self.stdout.write(f'{name:<8}{first_byte:>14.3f}'
+                              f'{elapsed:>9.2f}{peak / 2 ** 20:>9.1f}'
+                              f'{orders:>9}')
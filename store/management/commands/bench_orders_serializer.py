@@ -0,0 +1,61 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from rest_framework.renderers import JSONRenderer
+
+from api.serializers import OrderSerializer, OrderValuesSerializer
+from store.benchmarks import forget_seed, seed_catalog, seed_orders
+from store.models import Order
+
+
+class Command(BaseCommand):
+    help = ('Seed orders inside a rolled back transaction and serialize them '
+            'through OrderSerializer (prefetched model instances) and '
+            'OrderValuesSerializer (values() rows); report orders/sec and '
+            'queries for each. store.tests checks that both render the '
+            'same JSON.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--orders', type=int, default=10000)
+        parser.add_argument('--lines', type=int, default=3,
+                            help='Lines per order.')
+
+    def handle(self, *args, **options):
+        catalog = None
+        try:
+            with transaction.atomic():
+                catalog = seed_catalog(items=50, categories=2, tags=2)
+                user = seed_orders(catalog['items'], options['orders'],
+                                   options['lines'], catalog['prefix'])
+                self.run(Order.objects.filter(user=user), options)
+                transaction.set_rollback(True)
+        finally:
+            if catalog is not None:
+                forget_seed(catalog)
+
+    def measure(self, name, render):
+        with CaptureQueriesContext(connection) as ctx:
+            started = time.perf_counter()
+            content = JSONRenderer().render(render())
+            elapsed = time.perf_counter() - started
+        return name, elapsed, len(ctx.captured_queries), content
+
+    def run(self, orders, options):
+        results = [
+            self.measure('OrderSerializer', lambda: OrderSerializer(
+                orders.prefetch_related('items__item'), many=True
+            ).data),
+            self.measure('OrderValuesSerializer',
+                         lambda: OrderValuesSerializer(orders).data),
+        ]
+        count = options['orders']
+        self.stdout.write(f'{"path":<24}{"orders/s":>10}{"queries":>9}'
+                          f'{"seconds":>9}')
+        for name, elapsed, queries, _ in results:
+            self.stdout.write(f'{name:<24}{count / elapsed:>10.0f}'
+                              f'{queries:>9}{elapsed:>9.2f}')
+        self.stdout.write(
+            f'values() rows {results[0][1] / results[1][1]:.1f}x faster'
+        )
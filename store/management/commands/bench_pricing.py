@@ -0,0 +1,62 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from store import pricing
+from store.benchmarks import seed_catalog, seed_customer
+
+
+class Command(BaseCommand):
+    help = ('Compare store.pricing with the per-instance OrderItem price '
+            'methods on a seeded batch of order lines (rolled back).')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lines', type=int, default=500)
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            catalog = seed_catalog(items=options['lines'])
+            customer = seed_customer(catalog['items'], catalog['prefix'],
+                                     cart_size=options['lines'])
+            order = customer['order']
+            repeat = options['repeat']
+
+            def joined():
+                return order.items.select_related('item')
+
+            self.report('per-instance methods', repeat,
+                        lambda: self.per_instance(order.items.all()))
+            self.report('store.pricing', repeat,
+                        lambda: pricing.price_lines(order.items.all()))
+            self.report('per-instance, joined', repeat,
+                        lambda: self.per_instance(joined()))
+            self.report('store.pricing, joined', repeat,
+                        lambda: pricing.price_lines(joined()))
+            transaction.set_rollback(True)
+
+    def per_instance(self, lines):
+        return [
+            (line.get_total_item_price(),
+             line.get_total_discount_item_price()
+             if line.item.discount_price is not None else None,
+             line.get_amount_saved()
+             if line.item.discount_price is not None else None,
+             line.get_final_price())
+            for line in lines
+        ]
+
+    def report(self, name, repeat, run):
+        timings = []
+        for _ in range(repeat):
+            with CaptureQueriesContext(connection) as ctx:
+                started = time.perf_counter()
+                result = run()
+                timings.append(time.perf_counter() - started)
+        self.stdout.write(
+            f'{name:<22} {len(result)} lines, '
+            f'{len(ctx.captured_queries)} queries, '
+            f'best {min(timings) * 1000:.2f} ms'
+        )
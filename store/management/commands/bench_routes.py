@@ -0,0 +1,155 @@
+import json
+from functools import partial
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.urls import reverse
+
+from store.benchmarks import (benchmark_client,
+                              forget_seed,
+                              measure_route,
+                              reset_cart,
+                              seed_catalog,
+                              seed_customer)
+
+# Maximum number of SQL queries a single request to the route may issue
+# with warm caches (after --warmup requests), calibrated for the default
+# --items dataset, and the status it must answer with. Every measured
+# --repeat must stay within both.
+ROUTE_BUDGETS = {
+    'store:home': (3, 200),
+    'store:products': (3, 200),
+    'store:products-search': (3, 200),
+    'store:category_products': (4, 200),
+    'store:catalog': (5, 200),
+    'store:catalog-filtered': (7, 200),
+    'store:product': (3, 200),
+    'store:order-summary': (3, 200),
+    'store:checkout': (4, 200),
+    'store:request-refund': (2, 200),
+    'store:add-to-cart': (3, 302),
+    'store:remove-single-item-from-cart': (3, 302),
+    'store:remove-from-cart': (3, 302),
+    'store:add-coupon': (2, 302),
+    'store:checkout-post': (22, 302),
+    'api:api-root': (2, 200),
+    'api:items-list': (6, 200),
+    'api:items-detail': (4, 200),
+    'api:orders-list': (4, 200),
+    'api:orders-detail': (4, 200),
+}
+# Routes that change or order the cart; it is seeded again before each of
+# their requests.
+CART_ROUTES = {'store:add-to-cart', 'store:remove-single-item-from-cart',
+               'store:remove-from-cart', 'store:add-coupon',
+               'store:checkout-post'}
+
+
+def get_routes(catalog, customer):
+    item = catalog['items'][0]
+    cart_item = customer['order'].items.first().item
+    category = catalog['categories'][0]
+    order = customer['order']
+    return [
+        ('store:home', 'GET', reverse('store:home'), None),
+        ('store:products', 'GET', reverse('store:products'), None),
+        ('store:products-search', 'GET', reverse('store:products'),
+         {'q': item.title.split()[0][:4]}),
+        ('store:category_products', 'GET',
+         reverse('store:category_products', args=[category.id]), None),
+        ('store:catalog', 'GET', reverse('store:catalog'), None),
+        ('store:catalog-filtered', 'GET', reverse('store:catalog'),
+         {'category': category.id, 'tag': catalog['tags'][0].id,
+          'price': [0, 1, 2]}),
+        ('store:product', 'GET',
+         reverse('store:product', args=[item.slug]), None),
+        ('store:order-summary', 'GET', reverse('store:order-summary'), None),
+        ('store:checkout', 'GET', reverse('store:checkout'), None),
+        ('store:request-refund', 'GET', reverse('store:request-refund'),
+         None),
+        ('api:api-root', 'GET', reverse('api:api-root'), None),
+        ('api:items-list', 'GET', reverse('api:items-list'), None),
+        ('api:items-detail', 'GET',
+         reverse('api:items-detail', args=[item.id]), None),
+        ('api:orders-list', 'GET', reverse('api:orders-list'), None),
+        ('api:orders-detail', 'GET',
+         reverse('api:orders-detail', args=[order.id]), None),
+        ('store:add-to-cart', 'GET',
+         reverse('store:add-to-cart', args=[item.slug]), None),
+        ('store:remove-single-item-from-cart', 'GET',
+         reverse('store:remove-single-item-from-cart',
+                 args=[cart_item.slug]), None),
+        ('store:remove-from-cart', 'GET',
+         reverse('store:remove-from-cart', args=[cart_item.slug]), None),
+        ('store:add-coupon', 'POST', reverse('store:add-coupon'),
+         {'code': customer['coupon'].code}),
+        ('store:checkout-post', 'POST', reverse('store:checkout'),
+         {'shipping_address': 'Bench st. 2', 'shipping_country': 'RU',
+          'shipping_zip': '101000', 'payment_option': 'S'}),
+    ]
+
+
+class Command(BaseCommand):
+    help = ('Seed a catalog inside a rolled back transaction, request every '
+            'store and api route and check the SQL query budget per route.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--items', type=int, default=500)
+        parser.add_argument('--repeat', type=int, default=3)
+        parser.add_argument('--warmup', type=int, default=1,
+                            help='Unmeasured requests per route that fill '
+                                 'the caches first.')
+        parser.add_argument('--json', dest='json_path',
+                            help='Write per-route results to this file.')
+
+    def handle(self, *args, **options):
+        catalog = customer = None
+        try:
+            with transaction.atomic():
+                catalog = seed_catalog(items=options['items'])
+                customer = seed_customer(catalog['items'], catalog['prefix'])
+                results = self.run_routes(catalog, customer,
+                                          options['repeat'],
+                                          options['warmup'])
+                transaction.set_rollback(True)
+        finally:
+            # Out of the transaction, so the cache updates are not held
+            # for a commit that never comes.
+            if catalog is not None:
+                forget_seed(catalog, customer)
+
+        self.stdout.write(f'{"route":<38}{"status":>7}{"queries":>9}'
+                          f'{"budget":>8}{"sql ms":>10}{"wall ms":>10}')
+        for result in results:
+            row = result.as_dict()
+            line = (f'{row["name"]:<38}{row["status"]:>7}'
+                    f'{row["queries"]:>9}{row["budget"]:>8}'
+                    f'{row["query_time_ms"]:>10.2f}'
+                    f'{row["wall_time_ms"]:>10.2f}')
+            style = self.style.ERROR if result.failed else str
+            self.stdout.write(style(line))
+
+        if options['json_path']:
+            with open(options['json_path'], 'w') as f:
+                json.dump([r.as_dict() for r in results], f, indent=2)
+
+        failed = [r.name for r in results if r.failed]
+        if failed:
+            raise CommandError(
+                f'Query budget exceeded or unexpected status: '
+                f'{", ".join(failed)}'
+            )
+
+    def run_routes(self, catalog, customer, repeat, warmup):
+        client, isolated = benchmark_client(customer['user'])
+        results = []
+        with isolated:
+            for name, method, url, data in get_routes(catalog, customer):
+                budget, status = ROUTE_BUDGETS[name]
+                setup = (partial(reset_cart, customer)
+                         if name in CART_ROUTES else None)
+                results.append(measure_route(
+                    client, name, method, url, budget, data, repeat, warmup,
+                    expected_status=status, setup=setup
+                ))
+        return results
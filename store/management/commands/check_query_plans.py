@@ -0,0 +1,88 @@
+import re
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from store.models import (Address,
+                          Coupon,
+                          Item,
+                          ItemTombstone,
+                          Job,
+                          Order,
+                          OrderItem,
+                          Reservation)
+
+# Plan lines that read a whole table. A SQLite "SCAN t USING INDEX i" walks
+# an index in order (the keyset pages stop after LIMIT rows) and passes.
+FULL_SCANS = {
+    'sqlite': re.compile(r'\bSCAN (?!.*\bUSING\b)'),
+    'postgresql': re.compile(r'\bSeq Scan\b'),
+}
+
+
+def hot_queries():
+    now = timezone.now()
+    return {
+        'open order': Order.objects.filter(user_id=1, ordered=False),
+        'user orders': Order.objects.filter(user_id=1),
+        'placed order by key': Order.objects.filter(
+            user_id=1, ordered=True, idempotency_key='key'
+        ),
+        'order by ref code': Order.objects.filter(ref_code='ref'),
+        'open lines': OrderItem.objects.filter(user_id=1, ordered=False),
+        'open line': OrderItem.objects.filter(user_id=1, item_id=1,
+                                              ordered=False),
+        'placed line': OrderItem.objects.filter(user_id=1, item_id=1,
+                                                ordered=True),
+        'default address': Address.objects.filter(user_id=1, default=True),
+        'item by slug': Item.objects.filter(slug='slug'),
+        'catalog page': Item.objects.filter(
+            created_at__lte=now
+        ).order_by('-created_at', '-id')[:8],
+        'category page': Item.objects.filter(
+            category_id=1, created_at__lte=now
+        ).order_by('-created_at', '-id')[:8],
+        'item changes': Item.objects.filter(
+            updated_at__gt=now
+        ).order_by('updated_at', 'id')[:500],
+        'item deletions': ItemTombstone.objects.filter(
+            deleted_at__gt=now
+        ).order_by('deleted_at', 'id')[:500],
+        'coupon by code': Coupon.objects.filter(code='code'),
+        'due jobs': Job.objects.filter(status=Job.PENDING, run_at__lte=now),
+        'expired reservations': Reservation.objects.filter(
+            expires_at__lt=now
+        ).order_by('expires_at', 'id')[:500],
+    }
+
+
+class Command(BaseCommand):
+    help = ('EXPLAIN the hot lookups of the store (open cart, order and '
+            'address lookups, catalog pages, sync, jobs) and fail if any '
+            'of them reads a whole table instead of using an index. Only '
+            'the schema matters, so any migrated database will do.')
+
+    def handle(self, *args, **options):
+        pattern = FULL_SCANS.get(connection.vendor)
+        if pattern is None:
+            raise CommandError(
+                f'No plan check for the {connection.vendor} backend'
+            )
+        scans = []
+        with transaction.atomic():
+            if connection.vendor == 'postgresql':
+                # Small tables are cheaper to scan; only ask whether an
+                # index would be used.
+                with connection.cursor() as cursor:
+                    cursor.execute('SET LOCAL enable_seqscan = off')
+            for name, queryset in hot_queries().items():
+                plan = queryset.explain()
+                scanned = pattern.search(plan)
+                if scanned:
+                    scans.append(name)
+                self.stdout.write(f'{name:<22}{"SCAN" if scanned else "ok":<6}'
+                                  f'{" / ".join(plan.splitlines())}')
+        if scans:
+            raise CommandError(f'Full table scans: {", ".join(scans)}')
+        self.stdout.write(self.style.SUCCESS('Every hot lookup uses an index'))
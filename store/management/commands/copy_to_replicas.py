@@ -0,0 +1,34 @@
+import sqlite3
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+
+class Command(BaseCommand):
+    help = ('Copy the primary SQLite database into every SQLite replica '
+            'in DATABASE_REPLICAS. Stands in for replication when testing '
+            'the replica router locally; run it again to catch up.')
+
+    def handle(self, *args, **options):
+        primary = connections['default']
+        if not settings.DATABASE_REPLICAS:
+            raise CommandError('No replicas configured, set REPLICA_DB_NAMES')
+        for alias in settings.DATABASE_REPLICAS:
+            replica = connections[alias]
+            if primary.vendor != 'sqlite' or replica.vendor != 'sqlite':
+                raise CommandError(f'{alias}: only SQLite replicas can be '
+                                   f'copied')
+            replica.close()
+            primary.ensure_connection()
+            target = sqlite3.connect(replica.settings_dict['NAME'])
+            try:
+                # The online backup API takes a consistent snapshot even
+                # while the primary is being written.
+                primary.connection.backup(target)
+            finally:
+                target.close()
+            self.stdout.write(self.style.SUCCESS(
+                f'Copied {primary.settings_dict["NAME"]} to '
+                f'{replica.settings_dict["NAME"]}'
+            ))
@@ -0,0 +1,27 @@
+import sys
+
+from django.core.management.base import BaseCommand
+
+from store import exports
+
+
+class Command(BaseCommand):
+    help = 'Stream items or order lines as CSV or NDJSON.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('dataset', choices=exports.EXPORTS)
+        parser.add_argument('--format', choices=exports.FORMATS,
+                            default='csv')
+        parser.add_argument('--output', default='-',
+                            help='Output file, "-" for stdout.')
+        parser.add_argument('--chunk-size', type=int)
+
+    def handle(self, *args, **options):
+        chunks = exports.export(options['dataset'], options['format'],
+                                options['chunk_size'])
+        if options['output'] == '-':
+            sys.stdout.writelines(chunks)
+            return
+        with open(options['output'], 'w', encoding='utf-8',
+                  newline='') as output:
+            output.writelines(chunks)
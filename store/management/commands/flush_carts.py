@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from store import cart
+
+
+class Command(BaseCommand):
+    help = ('Write cached user carts changed since the last run to their '
+            'open orders. Run it periodically, e.g. every minute from cron.')
+
+    def handle(self, *args, **options):
+        flushed = cart.flush()
+        self.stdout.write(self.style.SUCCESS(f'Flushed {flushed} carts'))
@@ -0,0 +1,43 @@
+import time
+from concurrent.futures import as_completed
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from store import images
+from store.cache import bump_item_versions
+from store.models import Item
+
+
+class Command(BaseCommand):
+    help = 'Render thumbnail, card, detail and WebP variants of item images.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int,
+                            default=settings.IMAGE_WORKERS)
+        parser.add_argument('--force', action='store_true',
+                            help='Re-render variants that already exist.')
+
+    def handle(self, *args, **options):
+        names = (Item.objects.exclude(image='').order_by()
+                 .values_list('image', flat=True).distinct())
+        started = time.perf_counter()
+        rendered = failed = 0
+
+        with images.get_executor(options['workers']) as executor:
+            futures = {
+                images.submit(name, executor, options['force']): name
+                for name in names.iterator()
+            }
+            for future in as_completed(futures):
+                try:
+                    rendered += future.result()
+                except Exception as error:
+                    failed += 1
+                    self.stderr.write(f'{futures[future]}: {error}')
+
+        bump_item_versions(Item.objects.values_list('pk', flat=True))
+        self.stdout.write(self.style.SUCCESS(
+            f'Rendered {rendered} sizes for {len(futures)} images '
+            f'({failed} failed) in {time.perf_counter() - started:.1f}s'
+        ))
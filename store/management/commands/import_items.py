@@ -0,0 +1,121 @@
+import csv
+import json
+import sys
+import time
+from itertools import islice
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from store.bulk import RowResult, SlugCache, upsert_items
+
+
+def read_csv(stream):
+    yield from csv.DictReader(stream)
+
+
+def read_jsonl(stream):
+    # A line that is not a JSON object becomes an error result instead of
+    # ending the import.
+    for number, line in enumerate(stream, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as error:
+            yield RowResult(index=None, errors={
+                'line': [f'Line {number}: invalid JSON ({error})']
+            })
+            continue
+        if not isinstance(row, dict):
+            yield RowResult(index=None, errors={
+                'line': [f'Line {number}: expected an object']
+            })
+            continue
+        yield row
+
+
+READERS = {
+    'csv': read_csv,
+    'jsonl': read_jsonl,
+}
+
+
+class Command(BaseCommand):
+    help = ('Stream items from a CSV or JSONL file and upsert them by slug '
+            'in batches. Columns: slug, title, price, discount_price, '
+            'category (slug), tags (slugs separated by "|"), description, '
+            'image.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Input file, "-" for stdin.')
+        parser.add_argument('--format', choices=READERS,
+                            help='Defaults to the file extension.')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--max-errors', type=int, default=20,
+                            help='Errors printed per batch.')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or path.rsplit('.', 1)[-1].lower()
+        if fmt not in READERS:
+            raise CommandError(f'Unknown input format "{fmt}"')
+
+        stream = (sys.stdin if path == '-'
+                  else open(path, encoding='utf-8', newline=''))
+        try:
+            self.run(READERS[fmt](stream), options)
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+
+    def upsert(self, batch, slugs, start):
+        results = list(batch)
+        valid = [index for index, row in enumerate(batch)
+                 if not isinstance(row, RowResult)]
+        for index, result in zip(valid, upsert_items(
+            [batch[index] for index in valid], slugs
+        )):
+            results[index] = result
+        for index, result in enumerate(results):
+            result.index = start + index
+        return results
+
+    def run(self, rows, options):
+        slugs = SlugCache()
+        started = time.perf_counter()
+        total = errors = 0
+        batch_number = 0
+
+        while True:
+            batch = list(islice(rows, options['batch_size']))
+            if not batch:
+                break
+            batch_number += 1
+            batch_started = time.perf_counter()
+            with transaction.atomic():
+                results = self.upsert(batch, slugs, total)
+            elapsed = time.perf_counter() - batch_started
+
+            failed = [result for result in results if not result.ok]
+            created = sum(result.status == 'created' for result in results)
+            total += len(batch)
+            errors += len(failed)
+            self.stdout.write(
+                f'batch {batch_number}: {len(batch)} rows, '
+                f'{created} created, {len(batch) - created - len(failed)} '
+                f'updated, {len(failed)} errors, '
+                f'{len(batch) / elapsed:.0f} rows/s'
+            )
+            for result in failed[:options['max_errors']]:
+                self.stderr.write(
+                    f'  row {result.index} ({result.slug}): {result.errors}'
+                )
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {total - errors} of {total} rows in {elapsed:.1f}s '
+            f'({total / elapsed if elapsed else 0:.0f} rows/s), '
+            f'{errors} errors'
+        ))
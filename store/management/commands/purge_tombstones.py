@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from store import sync
+
+
+class Command(BaseCommand):
+    help = ('Delete item tombstones older than ITEM_TOMBSTONE_KEEP. Run it '
+            'periodically, e.g. daily from cron.')
+
+    def handle(self, *args, **options):
+        purged = sync.purge_tombstones()
+        self.stdout.write(self.style.SUCCESS(
+            f'Purged {purged} tombstones'
+        ))
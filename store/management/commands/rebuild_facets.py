@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from store import facets
+from store.models import FacetCount
+
+
+class Command(BaseCommand):
+    help = 'Recount the catalog facet table from scratch.'
+
+    def handle(self, *args, **options):
+        facets.rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt {FacetCount.objects.count()} facet counts'
+        ))
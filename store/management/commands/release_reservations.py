@@ -0,0 +1,19 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from store import stock
+
+
+class Command(BaseCommand):
+    help = ('Return expired stock reservations to stock. Run it '
+            'periodically, e.g. every minute from cron.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int,
+                            default=settings.STOCK_RELEASE_BATCH)
+
+    def handle(self, *args, **options):
+        released = stock.release_expired(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Released {released} reservations'
+        ))
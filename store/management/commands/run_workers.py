@@ -0,0 +1,62 @@
+import multiprocessing
+import os
+import signal
+import socket
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from store import jobs
+
+
+def serve(batch, once, sleep):
+    stopping = []
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(signum, lambda *args: stopping.append(True))
+    return jobs.work(f'{socket.gethostname()}:{os.getpid()}', batch, once,
+                     sleep, stop=lambda: bool(stopping))
+
+
+class Command(BaseCommand):
+    help = ('Run background job workers. Each worker is a process that '
+            'claims due jobs in batches; SIGTERM or Ctrl-C lets them finish '
+            'the current batch and exit.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int,
+                            default=settings.JOB_WORKERS)
+        parser.add_argument('--batch-size', type=int,
+                            default=settings.JOB_BATCH_SIZE)
+        parser.add_argument('--sleep', type=float, default=1.0,
+                            help='Seconds to wait when no job is due.')
+        parser.add_argument('--once', action='store_true',
+                            help='Exit when the queue has nothing due.')
+
+    def handle(self, *args, **options):
+        args = (options['batch_size'], options['once'], options['sleep'])
+        if options['workers'] <= 1:
+            processed = serve(*args)
+            self.stdout.write(self.style.SUCCESS(f'Ran {processed} jobs'))
+            return
+
+        # Children must not share the parent's database connection.
+        connections.close_all()
+        context = multiprocessing.get_context('fork')
+        workers = [context.Process(target=serve, args=args, daemon=True)
+                   for _ in range(options['workers'])]
+        for worker in workers:
+            worker.start()
+
+        def forward(signum, frame):
+            for worker in workers:
+                if worker.is_alive():
+                    os.kill(worker.pid, signal.SIGTERM)
+
+        signal.signal(signal.SIGTERM, forward)
+        signal.signal(signal.SIGINT, forward)
+        for worker in workers:
+            worker.join()
+        self.stdout.write(self.style.SUCCESS(
+            f'{len(workers)} workers stopped'
+        ))
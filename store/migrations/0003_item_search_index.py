@@ -0,0 +1,22 @@
+from django.db import migrations
+
+from store import search
+
+
+def create_index(apps, schema_editor):
+    search.create_index(schema_editor.connection)
+
+
+def drop_index(apps, schema_editor):
+    search.drop_index(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0002_auto_20231013_1714'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 3.2.9 on 2026-10-18 18:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0003_item_search_index'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='item',
+            options={'ordering': ('-created_at', '-id'), 'verbose_name': 'Item', 'verbose_name_plural': 'Items'},
+        ),
+        migrations.AddIndex(
+            model_name='item',
+            index=models.Index(fields=['-created_at', '-id'], name='item_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='item',
+            index=models.Index(fields=['category', '-created_at', '-id'], name='item_category_created_idx'),
+        ),
+    ]
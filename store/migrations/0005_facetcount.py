@@ -0,0 +1,52 @@
+# Generated by Django 3.2.9 on 2026-10-18 19:02
+
+from bisect import bisect_right
+from collections import Counter
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def populate_facets(apps, schema_editor):
+    Item = apps.get_model('store', 'Item')
+    FacetCount = apps.get_model('store', 'FacetCount')
+    counts = Counter()
+    for item in Item.objects.values('category_id', 'price', 'discount_price'):
+        price = item['discount_price'] or item['price']
+        counts[('price', str(bisect_right(settings.PRICE_FACETS, price)))] += 1
+        if item['category_id'] is not None:
+            counts[('category', str(item['category_id']))] += 1
+    for row in Item.label.through.objects.values('tag_id'):
+        counts[('tag', str(row['tag_id']))] += 1
+    FacetCount.objects.bulk_create(
+        FacetCount(facet=facet, value=value, count=count)
+        for (facet, value), count in counts.items()
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0004_item_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FacetCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('facet', models.CharField(choices=[('category', 'Category'), ('tag', 'Tag'), ('price', 'Price')], max_length=20, verbose_name='Facet')),
+                ('value', models.CharField(max_length=50, verbose_name='Value')),
+                ('count', models.IntegerField(default=0, verbose_name='Items count')),
+            ],
+            options={
+                'verbose_name': 'Facet count',
+                'verbose_name_plural': 'Facet counts',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='facetcount',
+            constraint=models.UniqueConstraint(fields=('facet', 'value'), name='unique_facet_value'),
+        ),
+        migrations.RunPython(populate_facets, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,70 @@
+# Generated by Django 3.2.9 on 2026-10-18 19:09
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.utils import timezone
+
+
+def dedupe_carts(apps, schema_editor):
+    Order = apps.get_model('store', 'Order')
+    OrderItem = apps.get_model('store', 'OrderItem')
+    Through = Order.items.through
+
+    # Lines of placed orders were left open by the old checkout.
+    OrderItem.objects.filter(ordered=False, order__ordered=True).update(
+        ordered=True
+    )
+
+    users = (Order.objects.filter(ordered=False).order_by()
+             .values('user_id').annotate(n=Count('id')).filter(n__gt=1)
+             .values_list('user_id', flat=True))
+    for user_id in list(users):
+        keep, *extra = Order.objects.filter(
+            user_id=user_id, ordered=False
+        ).order_by('id')
+        for order in extra:
+            keep.items.add(*order.items.all())
+            order.delete()
+
+    lines = (OrderItem.objects.filter(ordered=False).order_by()
+             .values('user_id', 'item_id')
+             .annotate(n=Count('id'), quantity=Sum('quantity'))
+             .filter(n__gt=1))
+    for row in list(lines):
+        keep, *extra = OrderItem.objects.filter(
+            ordered=False, user_id=row['user_id'], item_id=row['item_id']
+        ).order_by('id')
+        keep.quantity = row['quantity']
+        keep.save(update_fields=['quantity'])
+        order_ids = set(Through.objects.filter(
+            orderitem__in=extra
+        ).values_list('order_id', flat=True))
+        for order in Order.objects.filter(id__in=order_ids):
+            order.items.add(keep)
+        OrderItem.objects.filter(id__in=[line.id for line in extra]).delete()
+
+    for line in OrderItem.objects.filter(ordered=False, order__isnull=True):
+        order, _ = Order.objects.get_or_create(
+            user_id=line.user_id, ordered=False,
+            defaults={'ordered_date': timezone.now()}
+        )
+        order.items.add(line)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0006_item_updated_at'),
+    ]
+
+    operations = [
+        migrations.RunPython(dedupe_carts, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='order',
+            constraint=models.UniqueConstraint(condition=models.Q(('ordered', False)), fields=('user',), name='unique_open_order'),
+        ),
+        migrations.AddConstraint(
+            model_name='orderitem',
+            constraint=models.UniqueConstraint(condition=models.Q(('ordered', False)), fields=('user', 'item'), name='unique_open_order_item'),
+        ),
+    ]
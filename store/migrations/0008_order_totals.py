@@ -0,0 +1,41 @@
+# Generated by Django 3.2.9 on 2026-10-18 19:15
+
+from django.db import migrations, models
+from django.db.models import Count, F, Sum, Value
+from django.db.models.functions import Coalesce, NullIf
+
+
+def populate_totals(apps, schema_editor):
+    Order = apps.get_model('store', 'Order')
+    price = Coalesce(NullIf(F('items__item__discount_price'), Value(0.0)),
+                     F('items__item__price'))
+    for order in Order.objects.select_related('coupon').annotate(
+        lines_total=Sum(F('items__quantity') * price),
+        lines_count=Count('items'),
+    ).order_by():
+        order.total = order.lines_total or 0
+        if order.coupon is not None:
+            order.total -= order.coupon.amount
+        order.item_count = order.lines_count
+        order.save(update_fields=['total', 'item_count'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0007_open_cart_constraints'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='item_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Items count'),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='total',
+            field=models.FloatField(default=0, editable=False, verbose_name='Total'),
+        ),
+        migrations.RunPython(populate_totals, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 3.2.9 on 2026-10-18 19:18
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def snapshot_placed_orders(apps, schema_editor):
+    # Freeze placed orders at the prices they currently show.
+    Coupon = apps.get_model('store', 'Coupon')
+    Item = apps.get_model('store', 'Item')
+    Order = apps.get_model('store', 'Order')
+    OrderItem = apps.get_model('store', 'OrderItem')
+    item = Item.objects.filter(pk=OuterRef('item_id'))
+    OrderItem.objects.filter(ordered=True).update(
+        price=Subquery(item.values('price')),
+        discount_price=Subquery(item.values('discount_price')),
+    )
+    Order.objects.filter(ordered=True, coupon__isnull=False).update(
+        coupon_amount=Subquery(
+            Coupon.objects.filter(pk=OuterRef('coupon_id')).values('amount')
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0008_order_totals'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='coupon_amount',
+            field=models.FloatField(blank=True, editable=False, null=True, verbose_name='Coupon discount at checkout'),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='idempotency_key',
+            field=models.CharField(blank=True, editable=False, max_length=64, null=True, verbose_name='Idempotency key'),
+        ),
+        migrations.AddField(
+            model_name='orderitem',
+            name='discount_price',
+            field=models.FloatField(blank=True, editable=False, null=True, verbose_name='Discount price'),
+        ),
+        migrations.AddField(
+            model_name='orderitem',
+            name='price',
+            field=models.FloatField(blank=True, editable=False, null=True, verbose_name='Price'),
+        ),
+        migrations.AddConstraint(
+            model_name='order',
+            constraint=models.UniqueConstraint(fields=('user', 'idempotency_key'), name='unique_order_idempotency_key'),
+        ),
+        migrations.RunPython(snapshot_placed_orders,
+                             migrations.RunPython.noop),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 3.2.9 on 2026-10-18 19:26
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0010_jobs'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Stock',
+            fields=[
+                ('item', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stock', serialize=False, to='store.item', verbose_name='Item')),
+                ('on_hand', models.PositiveIntegerField(default=0, verbose_name='On hand')),
+                ('reserved', models.PositiveIntegerField(default=0, verbose_name='Reserved')),
+            ],
+            options={
+                'verbose_name': 'Stock',
+                'verbose_name_plural': 'Stock',
+            },
+        ),
+        migrations.CreateModel(
+            name='Reservation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cart_id', models.CharField(max_length=50, verbose_name='Cart')),
+                ('quantity', models.PositiveIntegerField(default=0, verbose_name='Quantity')),
+                ('expires_at', models.DateTimeField(db_index=True, verbose_name='Expires at')),
+                ('item', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='store.item', verbose_name='Item')),
+            ],
+            options={
+                'verbose_name': 'Reservation',
+                'verbose_name_plural': 'Reservations',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='reservation',
+            constraint=models.UniqueConstraint(fields=('cart_id', 'item'), name='unique_cart_reservation'),
+        ),
+    ]
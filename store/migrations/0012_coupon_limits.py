@@ -0,0 +1,99 @@
+# Generated by Django 3.2.9 on 2026-10-18 19:29
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+import django.db.models.deletion
+
+
+def dedupe_codes(apps, schema_editor):
+    Coupon = apps.get_model('store', 'Coupon')
+    Order = apps.get_model('store', 'Order')
+
+    codes = (Coupon.objects.order_by().values('code')
+             .annotate(n=Count('id')).filter(n__gt=1)
+             .values_list('code', flat=True))
+    for code in list(codes):
+        keep, *extra = Coupon.objects.filter(code=code).order_by('id')
+        Order.objects.filter(coupon__in=extra).update(coupon=keep)
+        Coupon.objects.filter(id__in=[coupon.id for coupon in extra]).delete()
+
+
+def count_uses(apps, schema_editor):
+    Coupon = apps.get_model('store', 'Coupon')
+    CouponRedemption = apps.get_model('store', 'CouponRedemption')
+    Order = apps.get_model('store', 'Order')
+
+    rows = (Order.objects.filter(ordered=True, coupon__isnull=False)
+            .order_by().values('coupon_id', 'user_id')
+            .annotate(n=Count('id')))
+    CouponRedemption.objects.bulk_create(
+        CouponRedemption(coupon_id=row['coupon_id'], user_id=row['user_id'],
+                         uses=row['n'])
+        for row in rows
+    )
+    Coupon.objects.update(uses=Coalesce(Subquery(
+        CouponRedemption.objects.filter(coupon=OuterRef('pk')).order_by()
+        .values('coupon').annotate(total=Sum('uses')).values('total')
+    ), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('store', '0011_stock'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='coupon',
+            name='max_uses',
+            field=models.PositiveIntegerField(blank=True, null=True, verbose_name='Max uses'),
+        ),
+        migrations.AddField(
+            model_name='coupon',
+            name='max_uses_per_user',
+            field=models.PositiveIntegerField(blank=True, null=True, verbose_name='Max uses per user'),
+        ),
+        migrations.AddField(
+            model_name='coupon',
+            name='uses',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Uses'),
+        ),
+        migrations.AddField(
+            model_name='coupon',
+            name='valid_from',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Valid from'),
+        ),
+        migrations.AddField(
+            model_name='coupon',
+            name='valid_until',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Valid until'),
+        ),
+        migrations.RunPython(dedupe_codes, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='coupon',
+            name='code',
+            field=models.CharField(max_length=15, unique=True, verbose_name='Promo Code'),
+        ),
+        migrations.CreateModel(
+            name='CouponRedemption',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('uses', models.PositiveIntegerField(default=0, verbose_name='Uses')),
+                ('coupon', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='store.coupon', verbose_name='Coupon')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL, verbose_name='User')),
+            ],
+            options={
+                'verbose_name': 'Coupon redemption',
+                'verbose_name_plural': 'Coupon redemptions',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='couponredemption',
+            constraint=models.UniqueConstraint(fields=('coupon', 'user'), name='unique_coupon_redemption'),
+        ),
+        migrations.RunPython(count_uses, migrations.RunPython.noop),
+    ]
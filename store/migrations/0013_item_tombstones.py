@@ -0,0 +1,40 @@
+# Generated by Django 3.2.9 on 2026-10-18 19:44
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0012_coupon_limits'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ItemTombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('item_id', models.PositiveIntegerField(verbose_name='Item id')),
+                ('slug', models.SlugField(db_index=False, verbose_name='Slug')),
+                ('deleted_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Deleted date')),
+            ],
+            options={
+                'verbose_name': 'Item tombstone',
+                'verbose_name_plural': 'Item tombstones',
+            },
+        ),
+        migrations.AlterField(
+            model_name='item',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, verbose_name='Updated date'),
+        ),
+        migrations.AddIndex(
+            model_name='item',
+            index=models.Index(fields=['updated_at', 'id'], name='item_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='itemtombstone',
+            index=models.Index(fields=['deleted_at', 'id'], name='tombstone_deleted_idx'),
+        ),
+    ]
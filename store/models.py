@@ -1,7 +1,10 @@
 from django.contrib.auth import get_user_model
 from django.conf import settings
 from django.db import models
+from django.db.models import Count, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, NullIf
 from django.shortcuts import reverse
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 from django_countries.fields import CountryField
 
@@ -98,6 +101,10 @@ class Item(models.Model):
         auto_now_add=True,
         verbose_name=_('Created date')
     )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name=_('Updated date')
+    )
 
     def get_absolute_url(self):
         return reverse("store:product",
@@ -117,7 +124,16 @@ class Item(models.Model):
         )
 
     class Meta:
-        ordering = ('-created_at',)
+        ordering = ('-created_at', '-id')
+        indexes = (
+            models.Index(fields=('-created_at', '-id'),
+                         name='item_created_idx'),
+            models.Index(fields=('category', '-created_at', '-id'),
+                         name='item_category_created_idx'),
+            # Delta sync seeks on (updated_at, id).
+            models.Index(fields=('updated_at', 'id'),
+                         name='item_updated_idx'),
+        )
         verbose_name = _('Item')
         verbose_name_plural = _('Items')
 
@@ -125,6 +141,124 @@ class Item(models.Model):
         return self.title
 
 
+class ItemTombstone(models.Model):
+    # Left by a deleted item so delta-sync consumers learn about it.
+    item_id = models.PositiveIntegerField(
+        verbose_name=_('Item id')
+    )
+    slug = models.SlugField(
+        db_index=False,
+        verbose_name=_('Slug')
+    )
+    deleted_at = models.DateTimeField(
+        default=timezone.now,
+        verbose_name=_('Deleted date')
+    )
+
+    class Meta:
+        indexes = (
+            models.Index(fields=('deleted_at', 'id'),
+                         name='tombstone_deleted_idx'),
+        )
+        verbose_name = _('Item tombstone')
+        verbose_name_plural = _('Item tombstones')
+
+    def __str__(self):
+        return f'{self.slug} ({self.item_id})'
+
+
+class FacetCount(models.Model):
+    CATEGORY = 'category'
+    TAG = 'tag'
+    PRICE = 'price'
+    FACET_CHOICES = (
+        (CATEGORY, _('Category')),
+        (TAG, _('Tag')),
+        (PRICE, _('Price')),
+    )
+
+    facet = models.CharField(
+        max_length=20,
+        choices=FACET_CHOICES,
+        verbose_name=_('Facet')
+    )
+    value = models.CharField(
+        max_length=50,
+        verbose_name=_('Value')
+    )
+    count = models.IntegerField(
+        default=0,
+        verbose_name=_('Items count')
+    )
+
+    class Meta:
+        constraints = (
+            models.UniqueConstraint(fields=('facet', 'value'),
+                                    name='unique_facet_value'),
+        )
+        verbose_name = _('Facet count')
+        verbose_name_plural = _('Facet counts')
+
+    def __str__(self):
+        return f'{self.facet}={self.value}: {self.count}'
+
+
+class Stock(models.Model):
+    item = models.OneToOneField(
+        Item,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stock',
+        verbose_name=_('Item')
+    )
+    on_hand = models.PositiveIntegerField(
+        default=0,
+        verbose_name=_('On hand')
+    )
+    reserved = models.PositiveIntegerField(
+        default=0,
+        verbose_name=_('Reserved')
+    )
+
+    class Meta:
+        verbose_name = _('Stock')
+        verbose_name_plural = _('Stock')
+
+    def __str__(self):
+        return f'{self.item_id}: {self.on_hand - self.reserved}'
+
+
+class Reservation(models.Model):
+    item = models.ForeignKey(
+        Item,
+        on_delete=models.CASCADE,
+        verbose_name=_('Item')
+    )
+    cart_id = models.CharField(
+        max_length=50,
+        verbose_name=_('Cart')
+    )
+    quantity = models.PositiveIntegerField(
+        default=0,
+        verbose_name=_('Quantity')
+    )
+    expires_at = models.DateTimeField(
+        db_index=True,
+        verbose_name=_('Expires at')
+    )
+
+    class Meta:
+        constraints = (
+            models.UniqueConstraint(fields=('cart_id', 'item'),
+                                    name='unique_cart_reservation'),
+        )
+        verbose_name = _('Reservation')
+        verbose_name_plural = _('Reservations')
+
+    def __str__(self):
+        return f'{self.cart_id}: {self.item_id} x {self.quantity}'
+
+
 class Address(models.Model):
     user = models.ForeignKey(
         User,
@@ -151,6 +285,12 @@ class Address(models.Model):
 
     class Meta:
         ordering = ('country',)
+        # Django filters booleans as a bare column ("default"), which a
+        # partial index matches and a composite one cannot.
+        indexes = (
+            models.Index(fields=('user',), condition=models.Q(default=True),
+                         name='address_user_default_idx'),
+        )
         verbose_name = _('Address')
         verbose_name_plural = _('Addresses')
 
@@ -197,6 +337,19 @@ class OrderItem(models.Model):
         default=1,
         verbose_name=_('Quantity')
     )
+    # Item prices at checkout; empty while the line is in a cart.
+    price = models.FloatField(
+        null=True,
+        blank=True,
+        editable=False,
+        verbose_name=_('Price')
+    )
+    discount_price = models.FloatField(
+        null=True,
+        blank=True,
+        editable=False,
+        verbose_name=_('Discount price')
+    )
 
     def get_total_item_price(self):
         return self.quantity * self.item.price
@@ -215,6 +368,17 @@ class OrderItem(models.Model):
 
     class Meta:
         ordering = ('item',)
+        constraints = (
+            models.UniqueConstraint(fields=('user', 'item'),
+                                    condition=models.Q(ordered=False),
+                                    name='unique_open_order_item'),
+        )
+        # Open lines are found through unique_open_order_item; this one
+        # serves the same lookup for placed lines.
+        indexes = (
+            models.Index(fields=('user', 'item', 'ordered'),
+                         name='orderitem_user_item_idx'),
+        )
         verbose_name = _('Order item')
         verbose_name_plural = _('Order items')
 
@@ -222,6 +386,55 @@ class OrderItem(models.Model):
         return f"{self.quantity} - {self.item.title}"
 
 
+def final_price_expression(prefix=''):
+    # SQL twin of OrderItem.get_final_price for one unit: of the item with
+    # prefix 'item__', of the checkout snapshot without.
+    return Coalesce(NullIf(F(f'{prefix}discount_price'), Value(0.0)),
+                    F(f'{prefix}price'))
+
+
+class OrderQuerySet(models.QuerySet):
+    # Totals of many orders in one statement: correlated subqueries over
+    # the order lines instead of Order.items.all() per order.
+    def _totals(self):
+        lines = (
+            OrderItem.objects.filter(order=OuterRef('pk')).order_by()
+            .values('order')
+        )
+        unit_price = Coalesce(final_price_expression(),
+                              final_price_expression('item__'))
+        line_total = lines.annotate(
+            value=Sum(F('quantity') * unit_price)
+        ).values('value')
+        line_count = lines.annotate(value=Count('pk')).values('value')
+        coupon = Coupon.objects.filter(
+            pk=OuterRef('coupon_id')
+        ).values('amount')
+        zero = Value(0.0)
+        return {
+            'total': (
+                Coalesce(Subquery(line_total,
+                                  output_field=models.FloatField()), zero)
+                - Coalesce(F('coupon_amount'),
+                           Subquery(coupon,
+                                    output_field=models.FloatField()),
+                           zero)
+            ),
+            'item_count': Coalesce(
+                Subquery(line_count, output_field=models.IntegerField()),
+                Value(0)
+            ),
+        }
+
+    def with_totals(self):
+        totals = self._totals()
+        return self.annotate(live_total=totals['total'],
+                             live_item_count=totals['item_count'])
+
+    def refresh_totals(self):
+        return self.update(**self._totals())
+
+
 class Order(models.Model):
     user = models.ForeignKey(
         User,
@@ -280,17 +493,56 @@ class Order(models.Model):
         null=True,
         verbose_name=_('Order Status')
     )
+    total = models.FloatField(
+        default=0,
+        editable=False,
+        verbose_name=_('Total')
+    )
+    item_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name=_('Items count')
+    )
+    coupon_amount = models.FloatField(
+        null=True,
+        blank=True,
+        editable=False,
+        verbose_name=_('Coupon discount at checkout')
+    )
+    idempotency_key = models.CharField(
+        max_length=64,
+        null=True,
+        blank=True,
+        editable=False,
+        verbose_name=_('Idempotency key')
+    )
+
+    objects = OrderQuerySet.as_manager()
 
     def get_total(self):
-        total = 0
-        for order_item in self.items.all():
-            total += order_item.get_final_price()
-        if self.coupon:
-            total -= self.coupon.amount
-        return total
+        # Kept up to date by store.signals, see OrderQuerySet.refresh_totals.
+        return self.total
+
+    def compute_totals(self):
+        return Order.objects.filter(pk=self.pk).with_totals().values_list(
+            'live_total', 'live_item_count'
+        ).get()
 
     class Meta:
         ordering = ('-ordered_date',)
+        constraints = (
+            models.UniqueConstraint(fields=('user',),
+                                    condition=models.Q(ordered=False),
+                                    name='unique_open_order'),
+            models.UniqueConstraint(fields=('user', 'idempotency_key'),
+                                    name='unique_order_idempotency_key'),
+        )
+        # The open order is found through unique_open_order.
+        indexes = (
+            models.Index(fields=('user', '-ordered_date'),
+                         name='order_user_date_idx'),
+            models.Index(fields=('ref_code',), name='order_ref_code_idx'),
+        )
         verbose_name = _('Order')
         verbose_name_plural = _('Orders')
 
@@ -327,17 +579,79 @@ class Payment(models.Model):
 class Coupon(models.Model):
     code = models.CharField(
         max_length=15,
+        unique=True,
         verbose_name=_('Promo Code')
     )
     amount = models.FloatField(
         verbose_name=_('Discount amount'),
         validators=[validate_min_value]
     )
+    valid_from = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name=_('Valid from')
+    )
+    valid_until = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name=_('Valid until')
+    )
+    max_uses = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        verbose_name=_('Max uses')
+    )
+    max_uses_per_user = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        verbose_name=_('Max uses per user')
+    )
+    uses = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name=_('Uses')
+    )
+
+    def is_active(self, now=None):
+        now = now or timezone.now()
+        return ((self.valid_from is None or self.valid_from <= now)
+                and (self.valid_until is None or now < self.valid_until))
+
+    def is_used_up(self):
+        return self.max_uses is not None and self.uses >= self.max_uses
 
     def __str__(self):
         return self.code
 
 
+class CouponRedemption(models.Model):
+    coupon = models.ForeignKey(
+        Coupon,
+        on_delete=models.CASCADE,
+        verbose_name=_('Coupon')
+    )
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        verbose_name=_('User')
+    )
+    uses = models.PositiveIntegerField(
+        default=0,
+        verbose_name=_('Uses')
+    )
+
+    class Meta:
+        constraints = (
+            models.UniqueConstraint(fields=('coupon', 'user'),
+                                    name='unique_coupon_redemption'),
+        )
+        verbose_name = _('Coupon redemption')
+        verbose_name_plural = _('Coupon redemptions')
+
+    def __str__(self):
+        return f'{self.coupon}: {self.user} x {self.uses}'
+
+
 class Refund(models.Model):
     order = models.ForeignKey(
         Order,
@@ -357,3 +671,79 @@ class Refund(models.Model):
 
     def __str__(self):
         return f"{self.pk}"
+
+
+class Job(models.Model):
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = (
+        (PENDING, _('Pending')),
+        (RUNNING, _('Running')),
+        (DONE, _('Done')),
+        (FAILED, _('Failed')),
+    )
+
+    name = models.CharField(
+        max_length=100,
+        verbose_name=_('Task')
+    )
+    payload = models.JSONField(
+        default=dict,
+        blank=True,
+        verbose_name=_('Payload')
+    )
+    status = models.CharField(
+        max_length=20,
+        choices=STATUS_CHOICES,
+        default=PENDING,
+        verbose_name=_('Status')
+    )
+    attempts = models.PositiveIntegerField(
+        default=0,
+        verbose_name=_('Attempts')
+    )
+    max_attempts = models.PositiveIntegerField(
+        default=5,
+        verbose_name=_('Max attempts')
+    )
+    run_at = models.DateTimeField(
+        default=timezone.now,
+        verbose_name=_('Run at')
+    )
+    locked_by = models.CharField(
+        max_length=100,
+        blank=True,
+        verbose_name=_('Locked by')
+    )
+    locked_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name=_('Locked at')
+    )
+    last_error = models.TextField(
+        blank=True,
+        verbose_name=_('Last error')
+    )
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name=_('Created date')
+    )
+    finished_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name=_('Finished at')
+    )
+
+    class Meta:
+        ordering = ('run_at', 'id')
+        indexes = (
+            models.Index(fields=('status', 'run_at'),
+                         name='job_status_run_at_idx'),
+        )
+        verbose_name = _('Job')
+        verbose_name_plural = _('Jobs')
+
+    def __str__(self):
+        return f'{self.name} #{self.pk}'
@@ -0,0 +1,152 @@
+import base64
+import binascii
+
+from django.db.models import Q
+from django.http import Http404
+from django.utils.dateparse import parse_datetime
+from django.utils.translation import gettext_lazy as _
+
+CURSOR_PARAM = 'cursor'
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(direction, value, pk):
+    raw = f'{direction}|{value.isoformat()}|{pk}'
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        direction, value, pk = raw.decode().split('|')
+        value = parse_datetime(value)
+        pk = int(pk)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise InvalidCursor(cursor)
+    if direction not in ('n', 'p') or value is None:
+        raise InvalidCursor(cursor)
+    return direction, value, pk
+
+
+def encode_offset(offset):
+    raw = f'o|{offset}'
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_offset(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        kind, offset = raw.decode().split('|')
+        offset = int(offset)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise InvalidCursor(cursor)
+    if kind != 'o' or offset < 0:
+        raise InvalidCursor(cursor)
+    return offset
+
+
+class KeysetPage:
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class KeysetPaginator:
+    # Seek pagination over (field, pk) in descending order: every page is a
+    # bounded index range scan, however deep it is.
+    field = 'created_at'
+
+    def __init__(self, queryset, per_page):
+        self.queryset = queryset
+        self.per_page = per_page
+
+    def _key(self, obj):
+        return getattr(obj, self.field), obj.pk
+
+    def _after(self, value, pk):
+        return (Q(**{f'{self.field}__lte': value})
+                & (Q(**{f'{self.field}__lt': value}) | Q(pk__lt=pk)))
+
+    def _before(self, value, pk):
+        return (Q(**{f'{self.field}__gte': value})
+                & (Q(**{f'{self.field}__gt': value}) | Q(pk__gt=pk)))
+
+    def page(self, cursor=None):
+        descending = (f'-{self.field}', '-pk')
+        if not cursor:
+            rows = list(self.queryset.order_by(*descending)
+                        [:self.per_page + 1])
+            has_more, has_before = len(rows) > self.per_page, False
+            rows = rows[:self.per_page]
+        else:
+            direction, value, pk = decode_cursor(cursor)
+            if direction == 'n':
+                rows = list(self.queryset.filter(self._after(value, pk))
+                            .order_by(*descending)[:self.per_page + 1])
+                has_more, has_before = len(rows) > self.per_page, True
+                rows = rows[:self.per_page]
+            else:
+                rows = list(self.queryset.filter(self._before(value, pk))
+                            .order_by(self.field, 'pk')[:self.per_page + 1])
+                has_more, has_before = True, len(rows) > self.per_page
+                rows = rows[:self.per_page][::-1]
+
+        next_cursor = previous_cursor = None
+        if rows and has_more:
+            next_cursor = encode_cursor('n', *self._key(rows[-1]))
+        if rows and has_before:
+            previous_cursor = encode_cursor('p', *self._key(rows[0]))
+        return KeysetPage(rows, next_cursor, previous_cursor)
+
+
+class OffsetPaginator:
+    # Pages in the queryset's own order, for orderings no index can seek
+    # (search rank, which the database computes for every match anyway):
+    # the cursor carries the offset. Same pages as KeysetPaginator.
+    def __init__(self, queryset, per_page):
+        self.queryset = queryset
+        self.per_page = per_page
+
+    def page(self, cursor=None):
+        offset = decode_offset(cursor) if cursor else 0
+        rows = list(self.queryset[offset:offset + self.per_page + 1])
+        next_cursor = previous_cursor = None
+        if len(rows) > self.per_page:
+            next_cursor = encode_offset(offset + self.per_page)
+        if offset:
+            previous_cursor = encode_offset(max(offset - self.per_page, 0))
+        return KeysetPage(rows[:self.per_page], next_cursor, previous_cursor)
+
+
+def paginate(request, queryset, per_page, paginator_class=None):
+    paginator = (paginator_class or KeysetPaginator)(queryset, per_page)
+    try:
+        page = paginator.page(request.GET.get(CURSOR_PARAM))
+    except InvalidCursor:
+        raise Http404(_('Invalid cursor'))
+    return paginator, page
+
+
+class KeysetPaginationMixin:
+    def paginate_queryset(self, queryset, page_size):
+        paginator, page = paginate(self.request, queryset, page_size)
+        return paginator, page, page.object_list, page.has_other_pages()
@@ -0,0 +1,75 @@
+from typing import NamedTuple, Optional
+
+from store.models import Item, OrderItem
+
+
+class LinePrice(NamedTuple):
+    total: float
+    discount_total: Optional[float]
+    saved: Optional[float]
+    final: float
+
+
+def price_line(quantity, price, discount_price):
+    # Same rules as the OrderItem.get_* price methods.
+    total = quantity * price
+    if discount_price is None:
+        return LinePrice(total, None, None, total)
+    discount_total = quantity * discount_price
+    return LinePrice(total, discount_total, total - discount_total,
+                     discount_total if discount_price else total)
+
+
+def item_prices(lines):
+    # (price, discount_price) by item id, from the items already loaded on
+    # the lines plus one query for the rest.
+    cached = OrderItem.item.field.is_cached
+    prices = {
+        line.item_id: (line.item.price, line.item.discount_price)
+        for line in lines if cached(line)
+    }
+    missing = {line.item_id for line in lines} - prices.keys()
+    if missing:
+        prices.update(
+            (pk, (price, discount_price))
+            for pk, price, discount_price in Item.objects.filter(
+                pk__in=missing
+            ).values_list('pk', 'price', 'discount_price')
+        )
+    return prices
+
+
+def _unit_prices(lines):
+    # Placed lines are priced from their checkout snapshot.
+    prices = item_prices([line for line in lines if line.price is None])
+    return [
+        (line.price, line.discount_price) if line.price is not None
+        else prices[line.item_id]
+        for line in lines
+    ]
+
+
+def price_lines(lines):
+    lines = list(lines)
+    return [price_line(line.quantity, *unit_prices)
+            for line, unit_prices in zip(lines, _unit_prices(lines))]
+
+
+def snapshot(lines):
+    # Copies the current item prices onto the lines (not saved).
+    lines = list(lines)
+    for line, (price, discount_price) in zip(lines, _unit_prices(lines)):
+        line.price, line.discount_price = price, discount_price
+    return lines
+
+
+def attach(lines):
+    # Stores each line's LinePrice on line.prices for templates and admin.
+    lines = list(lines)
+    for line, prices in zip(lines, price_lines(lines)):
+        line.prices = prices
+    return lines
+
+
+def total(prices):
+    return sum(line.final for line in prices)
@@ -0,0 +1,114 @@
+import random
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+
+# Catalog tables a view may read from a replica. Everything else (carts,
+# orders, stock, sessions, users) is always read from the primary.
+CATALOG_MODELS = {'store.item', 'store.item_label', 'store.category',
+                  'store.tag', 'store.facetcount'}
+PIN_COOKIE = 'primary_pin'
+
+
+class RequestState:
+    def __init__(self, pinned=False):
+        self.replica = None
+        self.pinned = pinned
+        self.wrote = False
+
+
+# Set per request by ReplicaMiddleware and cleared when the response is
+# finished (for streams, once the content has been sent); None outside
+# requests (commands, workers), which always use the primary.
+_state = ContextVar('replica_state', default=None)
+
+
+def begin(pinned=False):
+    state = RequestState(pinned)
+    _state.set(state)
+    return state
+
+
+def end():
+    _state.set(None)
+
+
+def use_replica():
+    # Lets the rest of the request read catalog tables from a replica,
+    # unless the client wrote recently. One replica per request keeps its
+    # reads consistent with each other.
+    state = _state.get()
+    if state is not None and settings.DATABASE_REPLICAS:
+        state.replica = random.choice(settings.DATABASE_REPLICAS)
+
+
+def replica_reads(view):
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if request.method in ('GET', 'HEAD'):
+            use_replica()
+        return view(request, *args, **kwargs)
+    return wrapper
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        # Related rows come from wherever their instance was loaded.
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db:
+            return instance._state.db
+        state = _state.get()
+        if (state is None or state.replica is None or state.pinned
+                or model._meta.label_lower not in CATALOG_MODELS):
+            return 'default'
+        return state.replica
+
+    def db_for_write(self, model, **hints):
+        # Whoever writes reads their own writes from the primary for the
+        # rest of the request and, through the pin cookie, for a while
+        # after it.
+        state = _state.get()
+        if state is not None:
+            state.pinned = state.wrote = True
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas get their schema from the primary.
+        return db not in settings.DATABASE_REPLICAS
+
+
+class ReplicaMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        state = begin(pinned=PIN_COOKIE in request.COOKIES)
+        try:
+            response = self.get_response(request)
+        except BaseException:
+            end()
+            raise
+        if state.wrote:
+            response.set_cookie(PIN_COOKIE, '1',
+                                max_age=settings.REPLICA_PIN_SECONDS,
+                                httponly=True, samesite='Lax')
+        if response.streaming:
+            response.streaming_content = self.stream(
+                response.streaming_content
+            )
+        else:
+            end()
+        return response
+
+    def stream(self, content):
+        # Streamed content is read after __call__ returns, under the same
+        # routing; closing the response closes this generator too.
+        try:
+            yield from content
+        finally:
+            end()
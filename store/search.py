@@ -0,0 +1,158 @@
+import re
+
+from django.db import connections
+from django.db.models import Q
+
+from store.models import Item
+
+FTS_TABLE = 'store_item_fts'
+PG_SEARCH_CONFIG = 'russian'
+
+SQLITE_INDEX = (
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+    "title, description, content='store_item', content_rowid='id', "
+    "tokenize='unicode61 remove_diacritics 2')",
+)
+SQLITE_TRIGGERS = (
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON store_item
+    BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, title, description)
+        VALUES (new.id, new.title, new.description);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON store_item
+    BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, description)
+        VALUES ('delete', old.id, old.title, old.description);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au
+    AFTER UPDATE OF title, description ON store_item
+    BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, description)
+        VALUES ('delete', old.id, old.title, old.description);
+        INSERT INTO {FTS_TABLE}(rowid, title, description)
+        VALUES (new.id, new.title, new.description);
+    END""",
+)
+SQLITE_REBUILD = (
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')",
+)
+SQLITE_DROP = (
+    f'DROP TRIGGER IF EXISTS {FTS_TABLE}_ai',
+    f'DROP TRIGGER IF EXISTS {FTS_TABLE}_ad',
+    f'DROP TRIGGER IF EXISTS {FTS_TABLE}_au',
+    f'DROP TABLE IF EXISTS {FTS_TABLE}',
+)
+
+PG_VECTOR = (
+    f"setweight(to_tsvector('{PG_SEARCH_CONFIG}', "
+    "coalesce({row}.title, '')), 'A') || "
+    f"setweight(to_tsvector('{PG_SEARCH_CONFIG}', "
+    "coalesce({row}.description, '')), 'B')"
+)
+PG_INDEX = (
+    'ALTER TABLE store_item ADD COLUMN IF NOT EXISTS search_vector tsvector',
+    'CREATE INDEX IF NOT EXISTS store_item_search_idx '
+    'ON store_item USING GIN (search_vector)',
+)
+PG_TRIGGERS = (
+    f"""CREATE OR REPLACE FUNCTION store_item_search_update()
+    RETURNS trigger AS $$
+    BEGIN
+        NEW.search_vector := {PG_VECTOR.format(row='NEW')};
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql""",
+    'DROP TRIGGER IF EXISTS store_item_search_trigger ON store_item',
+    """CREATE TRIGGER store_item_search_trigger
+    BEFORE INSERT OR UPDATE OF title, description ON store_item
+    FOR EACH ROW EXECUTE PROCEDURE store_item_search_update()""",
+)
+PG_REBUILD = (
+    'UPDATE store_item SET search_vector = '
+    + PG_VECTOR.format(row='store_item'),
+)
+PG_DROP = (
+    'DROP TRIGGER IF EXISTS store_item_search_trigger ON store_item',
+    'DROP FUNCTION IF EXISTS store_item_search_update()',
+    'DROP INDEX IF EXISTS store_item_search_idx',
+    'ALTER TABLE store_item DROP COLUMN IF EXISTS search_vector',
+)
+
+STATEMENTS = {
+    'sqlite': {
+        'index': SQLITE_INDEX,
+        'triggers': SQLITE_TRIGGERS,
+        'rebuild': SQLITE_REBUILD,
+        'drop': SQLITE_DROP,
+    },
+    'postgresql': {
+        'index': PG_INDEX,
+        'triggers': PG_TRIGGERS,
+        'rebuild': PG_REBUILD,
+        'drop': PG_DROP,
+    },
+}
+
+
+def _execute(connection, *kinds):
+    statements = STATEMENTS.get(connection.vendor)
+    if statements is None:
+        return
+    with connection.cursor() as cursor:
+        for kind in kinds:
+            for sql in statements[kind]:
+                cursor.execute(sql)
+
+
+def create_index(connection):
+    _execute(connection, 'index', 'triggers', 'rebuild')
+
+
+def install_triggers(connection):
+    # SQLite rebuilds store_item on most ALTERs, which silently drops
+    # the triggers, so they are re-created after every migrate run.
+    _execute(connection, 'triggers')
+
+
+def drop_index(connection):
+    _execute(connection, 'drop')
+
+
+def get_terms(query):
+    return re.findall(r'\w+', query.lower())
+
+
+def search_items(query, queryset=None):
+    if queryset is None:
+        queryset = Item.objects.all()
+    terms = get_terms(query or '')
+    if not terms:
+        return queryset.none()
+
+    vendor = connections[queryset.db].vendor
+
+    if vendor == 'sqlite':
+        match = ' '.join(f'"{term}"*' for term in terms)
+        return queryset.extra(
+            tables=[FTS_TABLE],
+            where=[f'{FTS_TABLE}.rowid = store_item.id',
+                   f'{FTS_TABLE} MATCH %s'],
+            params=[match],
+            select={'rank': f'bm25({FTS_TABLE}, 10.0, 1.0)'},
+            order_by=['rank', '-id'],
+        )
+
+    if vendor == 'postgresql':
+        tsquery = ' & '.join(f'{term}:*' for term in terms)
+        return queryset.extra(
+            where=['store_item.search_vector @@ to_tsquery(%s, %s)'],
+            params=[PG_SEARCH_CONFIG, tsquery],
+            select={'rank': 'ts_rank(store_item.search_vector, '
+                            'to_tsquery(%s, %s))'},
+            select_params=[PG_SEARCH_CONFIG, tsquery],
+            order_by=['-rank', '-id'],
+        )
+
+    return queryset.filter(
+        Q(title__icontains=query) | Q(description__icontains=query)
+    ).order_by('-created_at', '-id')
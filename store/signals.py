@@ -1,11 +1,253 @@
-from django.db.models.signals import post_save
+from django.contrib.auth.signals import user_logged_in
+from django.db import connections, router, transaction
+from django.db.models.signals import (m2m_changed,
+                                      post_delete,
+                                      post_save,
+                                      pre_delete,
+                                      pre_save)
+from django.utils import timezone
 
-from store.models import UserProfile, User
+from store import cart, coupons, facets, jobs, search
+from store.cache import bump_item_versions, invalidate_categories
+from store.models import (Category,
+                          Coupon,
+                          FacetCount,
+                          Item,
+                          ItemTombstone,
+                          Order,
+                          OrderItem,
+                          Tag)
 
 
-def userprofile_receiver(sender, instance, created, *args, **kwargs):
-    if created:
-        UserProfile.objects.create(user=instance)
+def search_triggers_receiver(sender, using, *args, **kwargs):
+    if router.allow_migrate_model(using, Item):
+        search.install_triggers(connections[using])
 
 
-post_save.connect(userprofile_receiver, sender=User)
+def item_version_receiver(sender, instance, *args, **kwargs):
+    bump_item_versions([instance.pk])
+
+
+def item_image_receiver(sender, instance, created, raw, *args, **kwargs):
+    # Only new images; the old name is read by item_pre_save_receiver.
+    if raw or not instance.image:
+        return
+    if not created and instance.image.name == getattr(
+            instance, '_old_image', None):
+        return
+    jobs.enqueue('render_item_images', {'item_id': instance.pk,
+                                        'name': instance.image.name})
+
+
+def item_pre_save_receiver(sender, instance, *args, **kwargs):
+    # One read of the stored row for the facet and image receivers.
+    old = None
+    if instance.pk is not None:
+        old = Item.objects.filter(pk=instance.pk).values(
+            'category_id', 'price', 'discount_price', 'image'
+        ).first()
+    instance._old_image = old.pop('image') if old else None
+    instance._facet_keys = facets.scalar_keys(**old) if old else set()
+
+
+def item_facets_post_save_receiver(sender, instance, *args, **kwargs):
+    facets.apply_diff(
+        getattr(instance, '_facet_keys', set()),
+        facets.scalar_keys(instance.category_id, instance.price,
+                           instance.discount_price)
+    )
+
+
+def item_facets_pre_delete_receiver(sender, instance, *args, **kwargs):
+    instance._facet_keys = facets.scalar_keys(
+        instance.category_id, instance.price, instance.discount_price
+    ) | facets.tag_keys(instance.label.values_list('pk', flat=True))
+
+
+def item_facets_post_delete_receiver(sender, instance, *args, **kwargs):
+    facets.apply_diff(getattr(instance, '_facet_keys', set()), set())
+
+
+def item_label_facets_receiver(sender, instance, action, reverse, pk_set,
+                               *args, **kwargs):
+    # remove() reports the ids it was given, linked or not; add() only
+    # the new ones.
+    linked = instance.item_set if reverse else instance.label
+    if action == 'pre_clear':
+        instance._cleared_labels = list(linked.values_list('pk', flat=True))
+        return
+    if action == 'pre_remove':
+        instance._removed_labels = list(
+            linked.filter(pk__in=pk_set).values_list('pk', flat=True)
+        )
+        return
+    if action == 'post_clear':
+        pk_set, sign = instance._cleared_labels, -1
+    elif action == 'post_remove':
+        pk_set, sign = instance._removed_labels, -1
+    elif action == 'post_add':
+        sign = 1
+    else:
+        return
+    if reverse:
+        facets.apply({(FacetCount.TAG, str(instance.pk)): sign * len(pk_set)})
+    elif sign > 0:
+        facets.apply_diff(set(), facets.tag_keys(pk_set))
+    else:
+        facets.apply_diff(facets.tag_keys(pk_set), set())
+
+
+def category_facets_receiver(sender, instance, *args, **kwargs):
+    facets.forget(FacetCount.CATEGORY, instance.pk)
+
+
+def tag_facets_receiver(sender, instance, *args, **kwargs):
+    facets.forget(FacetCount.TAG, instance.pk)
+
+
+def item_label_receiver(sender, instance, action, reverse, pk_set,
+                        *args, **kwargs):
+    if action in ('post_add', 'post_remove') and not pk_set:
+        return
+    if not reverse:
+        if not action.startswith('post_'):
+            return
+        pks = [instance.pk]
+    elif action == 'pre_clear':
+        pks = list(instance.item_set.values_list('pk', flat=True))
+    elif action in ('post_add', 'post_remove'):
+        pks = pk_set
+    else:
+        return
+    now = timezone.now()
+    Item.objects.filter(pk__in=pks).update(updated_at=now)
+    if not reverse:
+        instance.updated_at = now
+    bump_item_versions(pks)
+
+
+def item_tombstone_receiver(sender, instance, *args, **kwargs):
+    ItemTombstone.objects.create(item_id=instance.pk, slug=instance.slug)
+
+
+def category_items_receiver(sender, instance, *args, **kwargs):
+    # Deleting a category or tag changes its items' rows without a save.
+    Item.objects.filter(category=instance).update(updated_at=timezone.now())
+
+
+def tag_items_receiver(sender, instance, *args, **kwargs):
+    Item.objects.filter(label=instance).update(updated_at=timezone.now())
+
+
+def category_version_receiver(sender, instance, *args, **kwargs):
+    bump_item_versions(
+        Item.objects.filter(category=instance).values_list('pk', flat=True)
+    )
+
+
+def cart_merge_receiver(sender, request, user, *args, **kwargs):
+    if request is not None and hasattr(request, 'session'):
+        cart.merge(request, user)
+
+
+def order_totals_receiver(sender, instance, raw, *args, **kwargs):
+    if not raw:
+        Order.objects.filter(pk=instance.pk).refresh_totals()
+
+
+def order_items_totals_receiver(sender, instance, action, reverse,
+                                *args, **kwargs):
+    if not reverse:
+        if action.startswith('post_'):
+            Order.objects.filter(pk=instance.pk).refresh_totals()
+    elif action == 'pre_clear':
+        instance._total_order_ids = list(
+            instance.order_set.values_list('pk', flat=True)
+        )
+    elif action == 'post_clear':
+        Order.objects.filter(
+            pk__in=getattr(instance, '_total_order_ids', ())
+        ).refresh_totals()
+    elif action.startswith('post_'):
+        instance.order_set.all().refresh_totals()
+
+
+def order_item_totals_receiver(sender, instance, raw, *args, **kwargs):
+    if not raw:
+        Order.objects.filter(items=instance).refresh_totals()
+
+
+def stash_order_ids_receiver(sender, instance, *args, **kwargs):
+    lookup = 'items' if sender is OrderItem else 'coupon'
+    instance._total_order_ids = list(Order.objects.filter(
+        **{lookup: instance}
+    ).values_list('pk', flat=True))
+
+
+def stashed_order_totals_receiver(sender, instance, *args, **kwargs):
+    order_ids = getattr(instance, '_total_order_ids', ())
+    if order_ids:
+        Order.objects.filter(pk__in=order_ids).refresh_totals()
+
+
+def coupon_totals_receiver(sender, instance, raw, *args, **kwargs):
+    # Placed orders keep the total they were placed with.
+    if not raw:
+        Order.objects.filter(ordered=False, coupon=instance).refresh_totals()
+
+
+def coupon_cache_receiver(sender, *args, **kwargs):
+    # After commit, like categories_receiver.
+    transaction.on_commit(coupons.invalidate)
+
+
+def item_totals_receiver(sender, instance, created, raw, *args, **kwargs):
+    # Placed orders keep the total they were placed with.
+    if not (created or raw):
+        Order.objects.filter(
+            ordered=False, items__item=instance
+        ).refresh_totals()
+
+
+def categories_receiver(sender, instance, *args, **kwargs):
+    # After commit, or a concurrent request could cache the old list
+    # again right away, with no timeout.
+    transaction.on_commit(invalidate_categories)
+
+
+def tag_version_receiver(sender, instance, *args, **kwargs):
+    bump_item_versions(instance.item_set.values_list('pk', flat=True))
+
+
+post_save.connect(item_version_receiver, sender=Item)
+post_delete.connect(item_version_receiver, sender=Item)
+post_delete.connect(item_tombstone_receiver, sender=Item)
+post_save.connect(item_image_receiver, sender=Item)
+m2m_changed.connect(item_label_receiver, sender=Item.label.through)
+pre_save.connect(item_pre_save_receiver, sender=Item)
+post_save.connect(item_facets_post_save_receiver, sender=Item)
+pre_delete.connect(item_facets_pre_delete_receiver, sender=Item)
+post_delete.connect(item_facets_post_delete_receiver, sender=Item)
+m2m_changed.connect(item_label_facets_receiver, sender=Item.label.through)
+post_delete.connect(category_facets_receiver, sender=Category)
+post_delete.connect(tag_facets_receiver, sender=Tag)
+post_save.connect(category_version_receiver, sender=Category)
+pre_delete.connect(category_version_receiver, sender=Category)
+post_save.connect(categories_receiver, sender=Category)
+post_delete.connect(categories_receiver, sender=Category)
+post_save.connect(tag_version_receiver, sender=Tag)
+pre_delete.connect(tag_version_receiver, sender=Tag)
+pre_delete.connect(category_items_receiver, sender=Category)
+pre_delete.connect(tag_items_receiver, sender=Tag)
+user_logged_in.connect(cart_merge_receiver)
+post_save.connect(order_totals_receiver, sender=Order)
+m2m_changed.connect(order_items_totals_receiver, sender=Order.items.through)
+post_save.connect(order_item_totals_receiver, sender=OrderItem)
+pre_delete.connect(stash_order_ids_receiver, sender=OrderItem)
+post_delete.connect(stashed_order_totals_receiver, sender=OrderItem)
+post_save.connect(coupon_totals_receiver, sender=Coupon)
+pre_delete.connect(stash_order_ids_receiver, sender=Coupon)
+post_delete.connect(stashed_order_totals_receiver, sender=Coupon)
+post_save.connect(item_totals_receiver, sender=Item)
+post_save.connect(coupon_cache_receiver, sender=Coupon)
+post_delete.connect(coupon_cache_receiver, sender=Coupon)
@@ -0,0 +1,162 @@
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, OuterRef, Subquery, Value, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from store.models import Reservation, Stock
+
+# Every write below is a conditional UPDATE or DELETE, so the hot Stock row
+# is never read and written back. Writers that touch both tables update
+# Stock first, which keeps the lock order the same everywhere.
+
+
+class OutOfStock(Exception):
+    def __init__(self, item_ids):
+        super().__init__(item_ids)
+        self.item_ids = item_ids
+
+
+def _expires_at():
+    return timezone.now() + timedelta(
+        seconds=settings.STOCK_RESERVATION_TIMEOUT
+    )
+
+
+def tracked(item_ids):
+    # Items without a Stock row are not limited.
+    return set(Stock.objects.filter(
+        item_id__in=item_ids
+    ).values_list('item_id', flat=True))
+
+
+def reserve(cart_id, item_id, quantity=1):
+    # Returns False when fewer than quantity items are free.
+    with transaction.atomic():
+        if not Stock.objects.filter(
+            item_id=item_id, reserved__lte=F('on_hand') - quantity
+        ).update(reserved=F('reserved') + quantity):
+            return False
+        if not Reservation.objects.filter(
+            cart_id=cart_id, item_id=item_id
+        ).update(quantity=F('quantity') + quantity,
+                 expires_at=_expires_at()):
+            Reservation.objects.create(cart_id=cart_id, item_id=item_id,
+                                       quantity=quantity,
+                                       expires_at=_expires_at())
+    return True
+
+
+def release(cart_id, item_id, quantity=None):
+    # Gives back up to quantity (default: all) of the cart's reservation
+    # and returns how much was released. Nothing is released if the
+    # reservation changed meanwhile, e.g. the sweeper took it.
+    reservation = Reservation.objects.filter(
+        cart_id=cart_id, item_id=item_id
+    ).values_list('id', 'quantity').first()
+    if reservation is None:
+        return 0
+    pk, reserved = reservation
+    quantity = min(quantity or reserved, reserved)
+    with transaction.atomic():
+        Stock.objects.filter(item_id=item_id).update(
+            reserved=F('reserved') - quantity
+        )
+        current = Reservation.objects.filter(pk=pk, quantity=reserved)
+        if quantity == reserved:
+            changed = current.delete()[0]
+        else:
+            changed = current.update(quantity=F('quantity') - quantity)
+        if not changed:
+            transaction.set_rollback(True)
+            return 0
+    return quantity
+
+
+def transfer(source, target):
+    # Login merge: the guest cart's reservations move to the user's cart.
+    rows = Reservation.objects.filter(cart_id=source).values_list(
+        'item_id', 'quantity'
+    )
+    for item_id, quantity in rows:
+        with transaction.atomic():
+            if not Reservation.objects.filter(
+                cart_id=source, item_id=item_id, quantity=quantity
+            ).delete()[0]:
+                continue
+            if not Reservation.objects.filter(
+                cart_id=target, item_id=item_id
+            ).update(quantity=F('quantity') + quantity,
+                     expires_at=_expires_at()):
+                Reservation.objects.create(cart_id=target, item_id=item_id,
+                                           quantity=quantity,
+                                           expires_at=_expires_at())
+
+
+def consume(cart_id, quantities):
+    # Runs inside the checkout transaction. The cart's reservations are
+    # given back first, in one UPDATE that also takes the write lock on
+    # SQLite before anything is read; then each tracked line takes its
+    # quantity from on_hand only if that much is free. OutOfStock rolls
+    # the checkout back.
+    held = Reservation.objects.filter(cart_id=cart_id,
+                                      item_id=OuterRef('item_id'))
+    if not Stock.objects.filter(item_id__in=quantities).update(
+        reserved=F('reserved') - Coalesce(Subquery(held.values('quantity')),
+                                          0)
+    ):
+        return
+    Reservation.objects.filter(cart_id=cart_id,
+                               item_id__in=quantities).delete()
+    short = [
+        item_id for item_id in sorted(tracked(quantities))
+        if not Stock.objects.filter(
+            item_id=item_id, reserved__lte=F('on_hand') - quantities[item_id]
+        ).update(on_hand=F('on_hand') - quantities[item_id])
+    ]
+    if short:
+        raise OutOfStock(short)
+
+
+def release_expired(batch_size=None):
+    # Returns expired reservations to stock batch by batch. The batch's
+    # Stock rows are locked first by a no-op UPDATE (the usual lock order,
+    # and the write lock on SQLite), then its reservations are locked and
+    # read. What is subtracted is summed from exactly the rows deleted, so
+    # a reserve() or release() racing the sweep cannot be counted twice.
+    batch_size = batch_size or settings.STOCK_RELEASE_BATCH
+    cutoff = timezone.now()
+    released = 0
+    while True:
+        rows = list(Reservation.objects.filter(
+            expires_at__lt=cutoff
+        ).order_by('expires_at', 'id').values_list('id', 'item_id')[
+            :batch_size
+        ])
+        if not rows:
+            return released
+        ids = [pk for pk, _ in rows]
+        with transaction.atomic():
+            Stock.objects.filter(
+                item_id__in={item_id for _, item_id in rows}
+            ).update(reserved=F('reserved'))
+            expired = list(Reservation.objects.select_for_update().filter(
+                id__in=ids, expires_at__lt=cutoff
+            ).values_list('id', 'item_id', 'quantity'))
+            totals = Counter()
+            for _, item_id, quantity in expired:
+                totals[item_id] += quantity
+            if totals:
+                Stock.objects.filter(item_id__in=totals).update(
+                    reserved=F('reserved') - Case(
+                        *[When(item_id=item_id, then=Value(quantity))
+                          for item_id, quantity in totals.items()]
+                    )
+                )
+                Reservation.objects.filter(
+                    id__in=[pk for pk, _, _ in expired]
+                ).delete()
+        released += len(expired)
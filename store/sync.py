@@ -0,0 +1,95 @@
+import base64
+import binascii
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from store.models import ItemTombstone
+from store.pagination import InvalidCursor
+
+# A cursor is (time, item pk, tombstone pk): everything changed before
+# time has been delivered, and at time itself the items and tombstones up
+# to those primary keys.
+
+
+class CursorExpired(InvalidCursor):
+    pass
+
+
+def encode_cursor(value, item_pk, tombstone_pk):
+    raw = f'{value.isoformat()}|{item_pk}|{tombstone_pk}'
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        value, item_pk, tombstone_pk = raw.decode().split('|')
+        value = parse_datetime(value)
+        item_pk, tombstone_pk = int(item_pk), int(tombstone_pk)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise InvalidCursor(cursor)
+    if value is None:
+        raise InvalidCursor(cursor)
+    return value, item_pk, tombstone_pk
+
+
+def _after(queryset, field, value, pk, until):
+    queryset = queryset.filter(**{f'{field}__lte': until})
+    if value is not None:
+        queryset = queryset.filter(Q(**{f'{field}__gt': value})
+                                   | Q(**{field: value, 'pk__gt': pk}))
+    return queryset.order_by(field, 'pk')
+
+
+def changes(items, cursor=None, limit=None):
+    # Returns (changed items, tombstones, next cursor, more) for the next
+    # limit changes after cursor, oldest first. Rows younger than
+    # SYNC_SETTLE seconds are held back, so a transaction that stamped
+    # its rows before an earlier one committed is not skipped.
+    limit = limit or settings.SYNC_PAGE_SIZE
+    now = timezone.now()
+    value, item_pk, tombstone_pk = (decode_cursor(cursor) if cursor
+                                    else (None, 0, 0))
+    if value is not None and value < now - timedelta(
+        seconds=settings.ITEM_TOMBSTONE_KEEP
+    ):
+        raise CursorExpired(cursor)
+    until = now - timedelta(seconds=settings.SYNC_SETTLE)
+
+    events = sorted(
+        [(item.updated_at, 0, item.pk, item) for item in
+         _after(items, 'updated_at', value, item_pk, until)[:limit + 1]]
+        + [(tombstone.deleted_at, 1, tombstone.pk, tombstone)
+           for tombstone in _after(ItemTombstone.objects.all(),
+                                   'deleted_at', value, tombstone_pk,
+                                   until)[:limit + 1]],
+        key=lambda event: event[:3]
+    )
+    page, more = events[:limit], len(events) > limit
+    if not page:
+        return [], [], cursor, False
+
+    last = page[-1][0]
+    if last != value:
+        item_pk = tombstone_pk = 0
+    for changed_at, kind, pk, _ in page:
+        if changed_at == last:
+            if kind == 0:
+                item_pk = pk
+            else:
+                tombstone_pk = pk
+    return ([obj for _, kind, _, obj in page if kind == 0],
+            [obj for _, kind, _, obj in page if kind == 1],
+            encode_cursor(last, item_pk, tombstone_pk), more)
+
+
+def purge_tombstones():
+    return ItemTombstone.objects.filter(
+        deleted_at__lt=timezone.now() - timedelta(
+            seconds=settings.ITEM_TOMBSTONE_KEEP
+        )
+    ).delete()[0]
@@ -0,0 +1,30 @@
+from django.core.files.storage import default_storage
+from django.core.mail import send_mail
+from django.template.loader import render_to_string
+
+from store import images, jobs
+from store.cache import bump_item_versions
+from store.models import Order
+
+
+@jobs.task()
+def send_order_confirmation(order_id):
+    order = (Order.objects.select_related('user', 'shipping_address')
+             .get(pk=order_id))
+    if not order.user.email:
+        return
+    context = {'order': order, 'user': order.user}
+    send_mail(
+        render_to_string('email/order_confirmation_subject.txt',
+                         context).strip(),
+        render_to_string('email/order_confirmation_message.txt', context),
+        None,
+        [order.user.email],
+    )
+
+
+@jobs.task()
+def render_item_images(item_id, name):
+    if images.render_derivatives(default_storage.path(name),
+                                 images.get_targets(name)):
+        bump_item_versions([item_id])
@@ -1,13 +1,10 @@
 from django import template
-from store.models import Order
+
+from store import cart
 
 register = template.Library()
 
 
 @register.filter
-def cart_item_count(user):
-    if user.is_authenticated:
-        qs = Order.objects.filter(user=user, ordered=False)
-        if qs.exists():
-            return qs[0].items.count()
-    return 0
+def cart_item_count(request):
+    return cart.count(request)
@@ -0,0 +1,59 @@
+from django import template
+from django.db.models import prefetch_related_objects
+from django.template.loader import get_template
+from django.utils.safestring import mark_safe
+
+from store import images
+from store.pagination import CURSOR_PARAM
+from store.cache import get_cached_cards, set_cached_cards
+from store.models import Item
+
+register = template.Library()
+
+
+@register.simple_tag
+def item_cards(items, template_name):
+    items = list(items)
+    keys, cards = get_cached_cards(items, template_name)
+
+    missing = [item for item in items if keys[item.pk] not in cards]
+    if any(item._state.db != 'default' for item in missing):
+        # Cards are cached under the current version, so render them from
+        # the primary: a lagging replica may still have the old row.
+        fresh = Item.objects.using('default').in_bulk(
+            [item.pk for item in missing]
+        )
+        missing = [fresh[item.pk] for item in missing if item.pk in fresh]
+    if missing:
+        prefetch_related_objects(missing, 'category', 'label')
+        card_template = get_template(template_name)
+        rendered = {
+            keys[item.pk]: card_template.render({'item': item})
+            for item in missing
+        }
+        set_cached_cards(rendered)
+        cards.update(rendered)
+
+    return mark_safe(''.join(cards[keys[item.pk]] for item in items
+                             if keys[item.pk] in cards))
+
+
+@register.filter
+def image_srcset(image, ext=None):
+    if not image:
+        return ''
+    return images.srcset(image.name, ext and f'.{ext}')
+
+
+@register.filter
+def image_url(image, size):
+    if not image:
+        return ''
+    return images.url(image.name, size)
+
+
+@register.simple_tag(takes_context=True)
+def cursor_url(context, cursor):
+    query = context['request'].GET.copy()
+    query[CURSOR_PARAM] = cursor
+    return f'?{query.urlencode()}'
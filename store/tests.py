@@ -0,0 +1,174 @@
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.cache import caches
+from django.db import connection, transaction
+from django.db.models import Sum
+from django.test import TestCase, TransactionTestCase
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from api.serializers import OrderSerializer, OrderValuesSerializer
+from store import cart, stock
+from store.benchmarks import (benchmark_client,
+                              seed_catalog,
+                              seed_customer,
+                              seed_orders)
+from store.management.commands.check_query_plans import (FULL_SCANS,
+                                                         hot_queries)
+from store.models import Order, OrderItem, Reservation, Stock
+
+
+def parallel(func, args, threads=8):
+    # Each thread has its own connection; close it before the thread goes.
+    def call(arg):
+        try:
+            return func(arg)
+        finally:
+            connection.close()
+
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        return list(pool.map(call, args))
+
+
+class CacheResetMixin:
+    # Carts and cached rows outlive the rows of the previous test.
+    def setUp(self):
+        super().setUp()
+        for alias in ('default', cart.CART_CACHE):
+            caches[alias].clear()
+
+
+class QueryPlanTests(TestCase):
+    # The same lookups as check_query_plans, so a migration that drops or
+    # changes an index they rely on fails the suite.
+
+    def test_hot_queries_use_indexes(self):
+        pattern = FULL_SCANS.get(connection.vendor)
+        if pattern is None:
+            self.skipTest(f'No plan check for the {connection.vendor} backend')
+        if connection.vendor == 'postgresql':
+            # The test case runs in a transaction; see check_query_plans.
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL enable_seqscan = off')
+        for name, queryset in hot_queries().items():
+            with self.subTest(name):
+                self.assertNotRegex(queryset.explain(), pattern)
+
+
+class CartConcurrencyTests(CacheResetMixin, TransactionTestCase):
+    threads = 8
+    clicks = 10
+
+    def test_concurrent_adds_keep_every_increment(self):
+        catalog = seed_catalog(items=2, categories=1, tags=1)
+        items = catalog['items']
+        user = seed_customer(items, catalog['prefix'], cart_size=0)['user']
+        urls = [reverse('store:add-to-cart', args=[item.slug])
+                for item in items]
+
+        def clicks(number):
+            client, isolated = benchmark_client(user)
+            with isolated:
+                return [client.get(urls[(number + click) % len(urls)])
+                        .status_code for click in range(self.clicks)]
+
+        statuses = [status for result in parallel(clicks, range(self.threads),
+                                                  self.threads)
+                    for status in result]
+        self.assertEqual(statuses, [302] * self.threads * self.clicks)
+
+        cached = cart.load(cart.user_cart_id(user), user)['lines']
+        self.assertEqual(sum(cached.values()), len(statuses))
+        cart.materialize(user)
+        self.assertEqual(
+            Order.objects.filter(user=user, ordered=False).count(), 1
+        )
+        lines = OrderItem.objects.filter(user=user, ordered=False)
+        self.assertEqual(len(lines), len(items))
+        self.assertEqual(sum(line.quantity for line in lines), len(statuses))
+        self.assertEqual(Order.items.through.objects.filter(
+            orderitem__in=lines
+        ).count(), len(items))
+
+
+class StockConcurrencyTests(CacheResetMixin, TransactionTestCase):
+    threads = 8
+    clicks = 25
+    on_hand = 100
+
+    def test_concurrent_reservations_checkouts_and_sweeps(self):
+        item = seed_catalog(items=1, categories=1, tags=1)['items'][0]
+        Stock.objects.create(item=item, on_hand=self.on_hand)
+        url = reverse('store:add-to-cart', args=[item.slug])
+
+        def clicks(number):
+            client, isolated = benchmark_client()
+            with isolated:
+                for _ in range(self.clicks):
+                    client.get(url)
+            return client.session.get(cart.SESSION_KEY)
+
+        carts = {
+            cart_id: cart.load(cart_id)['lines'].get(item.pk, 0)
+            for cart_id in parallel(clicks, range(self.threads),
+                                    self.threads)
+        }
+        reserved = Stock.objects.get(item=item).reserved
+        held = Reservation.objects.filter(item=item).aggregate(
+            n=Sum('quantity')
+        )['n']
+        self.assertEqual(reserved,
+                         min(self.threads * self.clicks, self.on_hand))
+        self.assertEqual(held, reserved)
+        self.assertEqual(sum(carts.values()), reserved)
+
+        # Half of the carts check out while the sweeper releases the
+        # other half.
+        cart_ids = sorted(carts)
+        buyers, abandoned = cart_ids[::2], cart_ids[1::2]
+        Reservation.objects.filter(cart_id__in=abandoned).update(
+            expires_at=timezone.now()
+        )
+
+        def settle(cart_id):
+            if cart_id is None:
+                return stock.release_expired()
+            with transaction.atomic():
+                stock.consume(cart_id, {item.pk: carts[cart_id]})
+            return carts[cart_id]
+
+        sold = sum(parallel(settle, [None] + buyers, self.threads)[1:])
+        row = Stock.objects.get(item=item)
+        self.assertEqual(row.on_hand, self.on_hand - sold)
+        self.assertEqual(row.reserved, 0)
+        self.assertFalse(Reservation.objects.filter(item=item).exists())
+
+
+class OrderRepresentationTests(CacheResetMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        catalog = seed_catalog(items=10, categories=2, tags=2)
+        cls.user = seed_orders(catalog['items'], 20, 3, catalog['prefix'])
+
+    def test_values_serializer_renders_like_the_model_serializer(self):
+        orders = Order.objects.filter(user=self.user)
+        self.assertEqual(
+            JSONRenderer().render(OrderValuesSerializer(orders).data),
+            JSONRenderer().render(OrderSerializer(
+                orders.prefetch_related('items__item'), many=True
+            ).data)
+        )
+
+    def test_ndjson_stream_carries_the_json_list(self):
+        client, isolated = benchmark_client(self.user)
+        url = reverse('api:orders-list')
+        with isolated:
+            document = client.get(url, HTTP_ACCEPT='application/json').json()
+            response = client.get(url, HTTP_ACCEPT='application/x-ndjson')
+            stream = [json.loads(line) for line in b''.join(
+                response.streaming_content
+            ).splitlines() if line]
+        self.assertEqual(len(document), 20)
+        self.assertEqual(stream, document)
@@ -1,5 +1,6 @@
 from django.urls import path
 from store.views import (ItemDetailView,
+                         catalog,
                          category_products,
                          CheckoutView,
                          HomeView,
@@ -16,6 +17,7 @@ app_name = 'store'
 urlpatterns = [
     path('', HomeView.as_view(), name='home'),
     path('products/', products, name='products'),
+    path('catalog/', catalog, name='catalog'),
     path('category/<int:category_id>/', category_products, name='category_products'),
     path('checkout/', CheckoutView.as_view(), name='checkout'),
     path('order-summary/', OrderSummaryView.as_view(), name='order-summary'),
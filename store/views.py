@@ -1,11 +1,11 @@
+from uuid import uuid4
+
 from django.conf import settings
 from django.contrib import messages
-from django.contrib.auth.decorators import login_required
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.core.exceptions import ObjectDoesNotExist
-from django.db.models import Q
 from django.shortcuts import redirect, render, get_object_or_404
-from django.utils import timezone
+from django.utils.decorators import method_decorator
 from django.utils.translation import gettext_lazy as _
 from django.views.generic import (DetailView,
                                   ListView,
@@ -14,52 +14,118 @@ from django.views.generic import (DetailView,
 from store.forms import (CheckoutForm,
                          CouponForm,
                          RefundForm)
+from store import cart, checkout, coupons, facets, stock
+from store.cache import get_categories
 from store.models import (Address,
                           Category,
-                          Coupon,
+                          FacetCount,
                           Item,
-                          OrderItem,
                           Order,
-                          Refund)
-
-
-def get_categories():
-    return Category.objects.all()
+                          Refund,
+                          Tag)
+from store.pagination import (KeysetPaginationMixin,
+                              OffsetPaginator,
+                              paginate)
+from store.routers import replica_reads
+from store.search import search_items
 
 
+@replica_reads
 def category_products(request, category_id):
     category = get_object_or_404(Category, id=category_id)
-    items = Item.objects.filter(category=category)
+    paginator, page = paginate(request,
+                               Item.objects.filter(category=category),
+                               settings.PAGE_SIZE)
 
     context = {
         'category': category,
-        'items': items,
+        'items': page.object_list,
+        'page_obj': page,
+        'is_paginated': page.has_other_pages(),
     }
     return render(request, 'category_products.html', context)
 
 
+def _selected_ids(request, name):
+    return [int(value) for value in request.GET.getlist(name)
+            if value.isdigit()]
+
+
+def _facet_options(objects, counts, selected):
+    return [
+        {
+            'value': value,
+            'label': label,
+            'count': counts.get(str(value), 0),
+            'checked': value in selected,
+        }
+        for value, label in objects
+    ]
+
+
+@replica_reads
+def catalog(request):
+    selected = {
+        'categories': _selected_ids(request, 'category'),
+        'tags': _selected_ids(request, 'tag'),
+        'prices': _selected_ids(request, 'price'),
+    }
+    items = facets.filter_items(Item.objects.all(), **selected)
+    paginator, page = paginate(request, items, settings.PAGE_SIZE)
+    counts = facets.get_counts(Item.objects.all(), **selected)
+
+    prices = []
+    for bucket in facets.price_buckets():
+        low, high = facets.price_range(bucket)
+        prices.append((bucket, f'{low}–{high}₽' if high else f'от {low}₽'))
+
+    context = {
+        'items': page.object_list,
+        'page_obj': page,
+        'is_paginated': page.has_other_pages(),
+        'category_facets': _facet_options(
+            [(category.id, category.name) for category in get_categories()],
+            counts[FacetCount.CATEGORY], selected['categories']
+        ),
+        'tag_facets': _facet_options(
+            Tag.objects.values_list('id', 'title'),
+            counts[FacetCount.TAG], selected['tags']
+        ),
+        'price_facets': _facet_options(
+            prices, counts[FacetCount.PRICE], selected['prices']
+        ),
+    }
+    return render(request, 'catalog.html', context)
+
+
+@replica_reads
 def products(request):
     query = request.GET.get('q')
-    items = Item.objects.all().filter(
-        Q(title__icontains=query) | Q(description__icontains=query)
-    ) if query else Item.objects.all()
+    if query:
+        # Kept in rank order.
+        paginator, page = paginate(request, search_items(query),
+                                   settings.PAGE_SIZE, OffsetPaginator)
+    else:
+        paginator, page = paginate(request, Item.objects.all(),
+                                   settings.PAGE_SIZE)
 
     context = {
-        'items': items,
+        'items': page.object_list,
+        'page_obj': page,
+        'is_paginated': page.has_other_pages(),
         'query': query
     }
     return render(request, 'products.html', context)
 
 
-class CheckoutView(View):
+class CheckoutView(LoginRequiredMixin, View):
     def get(self, request, *args, **kwargs):
-        try:
-            order = Order.objects.get(user=request.user, ordered=False)
-        except ObjectDoesNotExist:
+        order = cart.get_cart(request)
+        if not order:
             messages.info(request, _('У вас нет активного заказа'))
-            return redirect('store:checkout')
+            return redirect('store:order-summary')
 
-        form = CheckoutForm()
+        form = CheckoutForm(initial={'idempotency_key': uuid4().hex})
         default_shipping_address = Address.objects.filter(
             user=request.user,
             default=True
@@ -76,26 +142,28 @@ class CheckoutView(View):
 
     def post(self, request, *args, **kwargs):
         form = CheckoutForm(request.POST)
-        try:
-            order = Order.objects.get(user=request.user, ordered=False)
-        except ObjectDoesNotExist:
-            messages.warning(request, 'У вас нет активного заказа')
-            return redirect('store:order-summary')
-
         if form.is_valid():
-            payment_option = form.cleaned_data.get('payment_option')
-            order.payment_option = payment_option
-
-            shipping_address = Address(
-                user=request.user,
-                street_address=form.cleaned_data.get('shipping_address'),
-                country=form.cleaned_data.get('shipping_country'),
-                zip=form.cleaned_data.get('shipping_zip'),
-            )
-            shipping_address.save()
-            order.shipping_address = shipping_address
-            order.ordered = True
-            order.save()
+            idempotency_key = (form.cleaned_data.get('idempotency_key')
+                               or request.headers.get('Idempotency-Key'))
+            shipping = {
+                'street_address': form.cleaned_data.get('shipping_address'),
+                'country': form.cleaned_data.get('shipping_country'),
+                'zip': form.cleaned_data.get('shipping_zip'),
+            }
+            try:
+                checkout.place_order(request.user, shipping, idempotency_key)
+            except checkout.EmptyCart:
+                messages.warning(request, 'У вас нет активного заказа')
+                return redirect('store:order-summary')
+            except coupons.CouponUnavailable:
+                cart.set_coupon(request, None)
+                messages.warning(request, 'Купон больше недоступен, '
+                                          'проверьте сумму заказа')
+                return redirect('store:checkout')
+            except stock.OutOfStock:
+                messages.warning(request,
+                                 'Некоторых товаров нет в нужном количестве')
+                return redirect('store:order-summary')
 
             messages.success(request, 'Ваш заказ успешно создан!')
             return redirect('/')
@@ -104,105 +172,57 @@ class CheckoutView(View):
         return redirect('store:checkout')
 
 
-class HomeView(ListView):
+@method_decorator(replica_reads, name='dispatch')
+class HomeView(KeysetPaginationMixin, ListView):
     model = Item
     paginate_by = settings.PAGE_SIZE
     template_name = 'home.html'
 
-    def get_context_data(self, **kwargs):
-        context = super().get_context_data(**kwargs)
-        context['categories'] = Category.objects.all()
-        return context
-
 
-class OrderSummaryView(LoginRequiredMixin, View):
+class OrderSummaryView(View):
     def get(self, *args, **kwargs):
-        try:
-            order = Order.objects.get(
-                user=self.request.user,
-                ordered=False
-            )
-        except ObjectDoesNotExist:
-            messages.warning(self.request, 'У вас нет активного заказа')
-            return redirect('/')
-
-        context = {'object': order}
+        context = {'object': cart.get_cart(self.request)}
         return render(self.request, 'order_summary.html', context)
 
 
+@method_decorator(replica_reads, name='dispatch')
 class ItemDetailView(DetailView):
     model = Item
     template_name = 'product.html'
 
 
-@login_required
-def add_to_cart(request, slug):
-    item = get_object_or_404(Item, slug=slug)
-    order_item, created = OrderItem.objects.get_or_create(
-        item=item,
-        user=request.user,
-        ordered=False
-    )
-    order_qs = Order.objects.filter(user=request.user, ordered=False).first()
-
-    if order_qs:
-        if order_qs.items.filter(item__slug=item.slug).exists():
-            order_item.quantity += 1
-            order_item.save()
-            messages.info(request, "Количество товаров обновлено.")
-        else:
-            order_qs.items.add(order_item)
-            messages.info(request, "Товар добавлен в корзину.")
-    else:
-        ordered_date = timezone.now()
-        order = Order.objects.create(user=request.user, ordered_date=ordered_date)
-        order.items.add(order_item)
-        messages.info(request, "Товар добавлен в корзину.")
+CART_MESSAGES = {
+    cart.ADDED: _('Товар добавлен в корзину.'),
+    cart.UPDATED: _('Количество товаров обновлено.'),
+    cart.REMOVED: _('Товар удален из корзины.'),
+    cart.OUT_OF_STOCK: _('Товара нет в наличии.'),
+}
 
-    return redirect("store:order-summary")
 
+def _cart_message(request, status):
+    if status is not None:
+        messages.info(request, CART_MESSAGES[status])
+    return redirect('store:order-summary')
 
-@login_required
-def remove_from_cart(request, slug):
-    item = get_object_or_404(Item, slug=slug)
-    order_qs = Order.objects.filter(user=request.user, ordered=False).first()
 
-    if order_qs and order_qs.items.filter(item__slug=item.slug).exists():
-        order_item = OrderItem.objects.get(item=item, user=request.user, ordered=False)
-        order_item.delete()
-        messages.info(request, 'Товар удален из корзины.')
+def add_to_cart(request, slug):
+    return _cart_message(request, cart.add_item(request, slug))
 
-    return redirect('store:order-summary')
 
+def remove_from_cart(request, slug):
+    return _cart_message(request, cart.remove_item(request, slug))
 
-@login_required
-def remove_single_item_from_cart(request, slug):
-    item = get_object_or_404(Item, slug=slug)
-    order_qs = Order.objects.filter(user=request.user, ordered=False).first()
-
-    if order_qs and order_qs.items.filter(item__slug=item.slug).exists():
-        order_item = OrderItem.objects.get(item=item, user=request.user, ordered=False)
-        if order_item.quantity > 1:
-            order_item.quantity -= 1
-            order_item.save()
-            messages.info(request, 'Количество товаров обновлено.')
-        else:
-            order_item.delete()
-            messages.info(request, 'Товар удален из корзины.')
 
-    return redirect('store:order-summary')
+def remove_single_item_from_cart(request, slug):
+    return _cart_message(request, cart.decrement_item(request, slug))
 
 
-def get_coupon(request, code):
-    try:
-        coupon = Coupon.objects.get(code=code)
-    except Coupon.DoesNotExist:
-        messages.info(
-            request,
-            'Купон не существует'
-        )
-        return None
-    return coupon
+COUPON_MESSAGES = {
+    coupons.NOT_FOUND: 'Купон не существует',
+    coupons.INACTIVE: 'Купон сейчас не действует',
+    coupons.USED_UP: 'Купон больше недоступен',
+    coupons.THROTTLED: 'Слишком много попыток. Попробуйте позже',
+}
 
 
 class AddCouponView(View):
@@ -210,16 +230,15 @@ class AddCouponView(View):
         form = CouponForm(self.request.POST or None)
         if form.is_valid():
             code = form.cleaned_data.get('code')
-            order = Order.objects.get(user=self.request.user, ordered=False)
-            coupon = get_coupon(self.request, code)
+            coupon, error = coupons.lookup(self.request, code)
             if coupon:
-                order.coupon = coupon
-                order.save()
+                cart.set_coupon(self.request, coupon)
                 messages.success(
                     self.request,
                     'Купон успешно применён'
                 )
                 return redirect('store:checkout')
+            messages.info(self.request, COUPON_MESSAGES[error])
 
         return redirect('store:checkout')
 
@@ -35,6 +35,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Outermost, so it sees the session written on the way out.
+    'store.routers.ReplicaMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -65,6 +67,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'store.context_processors.categories',
             ],
         },
     },
@@ -87,9 +90,65 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # A file, not the in-memory default: the concurrency tests in
+        # store.tests need writers that wait for each other's locks.
+        'TEST': {'NAME': BASE_DIR / 'test_db.sqlite3'},
     }
 }
 
+# Read replicas for the catalog views, see store.routers. For a local
+# stand-in list SQLite files in REPLICA_DB_NAMES and fill them with
+# copy_to_replicas; real replicas go into DATABASES and DATABASE_REPLICAS
+# in local_settings.
+DATABASE_REPLICAS = []
+for number, name in enumerate(config('REPLICA_DB_NAMES', default='',
+                                     cast=Csv()), 1):
+    DATABASES[f'replica{number}'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / name,
+    }
+    DATABASE_REPLICAS.append(f'replica{number}')
+DATABASE_ROUTERS = ['store.routers.ReplicaRouter']
+# How long a client that wrote keeps reading from the primary; should
+# cover the replication lag.
+REPLICA_PIN_SECONDS = 10
+
+# Override CACHES in local_settings with a shared backend (memcached/redis)
+# in production: item versions kept in the default cache invalidate the
+# per-process fragment cache of every worker.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'default',
+        'OPTIONS': {
+            'MAX_ENTRIES': 50000,
+        },
+    },
+    'fragments': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'fragments',
+        'TIMEOUT': 3600,
+        'OPTIONS': {
+            'MAX_ENTRIES': config('FRAGMENT_CACHE_MAX_ENTRIES',
+                                  default=5000, cast=int),
+        },
+    },
+    # Carts and their write-behind bookkeeping (store.cart). Guest carts
+    # and unflushed user carts exist nowhere else, so this cache must not
+    # evict: in production a shared backend that every worker, the
+    # flush_carts command and checkout reach (e.g. redis with
+    # maxmemory-policy noeviction), never a per-process locmem.
+    'carts': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'carts',
+        'TIMEOUT': None,
+        'OPTIONS': {
+            # Large enough that locmem never culls.
+            'MAX_ENTRIES': 10 ** 9,
+        },
+    },
+}
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -121,6 +180,14 @@ STATICFILES_DIRS = [
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Widths of the derivatives rendered for Item.image, see store.images.
+IMAGE_SIZES = {
+    'thumb': 160,
+    'card': 320,
+    'detail': 640,
+}
+IMAGE_WORKERS = config('IMAGE_WORKERS', default=2, cast=int)
+
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 AUTHENTICATION_BACKENDS = (
     'django.contrib.auth.backends.ModelBackend',
@@ -130,6 +197,46 @@ AUTHENTICATION_BACKENDS = (
 EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
 
 PAGE_SIZE = 8
+# Upper bounds of the catalog price facet buckets; the last one is open.
+PRICE_FACETS = (1000, 3000, 5000, 10000)
+API_PAGE_SIZE = 50
+# Rows accepted by one POST to /api/items/bulk/.
+API_BULK_MAX_ITEMS = 1000
+# Rows loaded and serialized at a time by NDJSON list streams.
+API_STREAM_CHUNK_SIZE = 500
+# Delta sync (/api/items/changes/): changes per page, how long fresh
+# changes are held back so slower concurrent commits are not skipped, and
+# how long deletions are remembered. Older cursors must resync in full.
+SYNC_PAGE_SIZE = 500
+SYNC_SETTLE = 2
+ITEM_TOMBSTONE_KEEP = 60 * 60 * 24 * 30
+EXPORT_CHUNK_SIZE = 2000
+# Carts live in the carts cache; user carts are written to the database
+# by checkout and the flush_carts command.
+CART_TIMEOUT = 60 * 60 * 24 * 14
+# Navbar badge counter, recomputed from the cart when it expires.
+CART_COUNT_TIMEOUT = 60 * 60
+# Stock reserved by add-to-cart is held this long after the last click,
+# then returned by the release_reservations command.
+STOCK_RESERVATION_TIMEOUT = 60 * 15
+STOCK_RELEASE_BATCH = 500
+# Coupon lookups are cached, unknown codes for a shorter time. A client
+# entering COUPON_MAX_FAILURES unknown codes is refused for the window.
+COUPON_CACHE_TIMEOUT = 60 * 60
+COUPON_MISS_TIMEOUT = 60 * 5
+COUPON_MAX_FAILURES = 10
+COUPON_FAILURE_WINDOW = 60 * 10
+# Background jobs, see store.jobs and the run_workers command. Retries
+# wait JOB_RETRY_DELAY seconds, doubling up to JOB_MAX_RETRY_DELAY.
+JOB_WORKERS = config('JOB_WORKERS', default=2, cast=int)
+JOB_BATCH_SIZE = 10
+JOB_MAX_ATTEMPTS = 5
+JOB_RETRY_DELAY = 30
+JOB_MAX_RETRY_DELAY = 60 * 60
+# Running jobs locked longer than this are assumed to have lost their
+# worker and are queued again.
+JOB_LOCK_TIMEOUT = 60 * 10
+JOB_KEEP_DONE = 60 * 60 * 24 * 7
 SITE_ID = 1
 LOGIN_REDIRECT_URL = '/'
 